@@ -0,0 +1,188 @@
+import csv
+from io import StringIO
+from time import perf_counter, sleep
+
+import pandas as pd
+import shapely
+
+
+def _a_texto_csv(filas):
+    """
+    Serializa un iterable de filas en un buffer CSV listo para COPY.
+
+    Los valores nulos (None/NaN) se escriben como campo vacío sin comillas,
+    que COPY interpreta como NULL.
+
+    Args:
+        filas (iterable): Iterable de tuplas/listas con los valores de cada fila.
+
+    Returns:
+        tuple: (buffer StringIO posicionado al inicio, número de filas escritas)
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    total = 0
+    for fila in filas:
+        writer.writerow([None if pd.isna(valor) else valor for valor in fila])
+        total += 1
+    buffer.seek(0)
+    return buffer, total
+
+
+def ewkb_hex(geometrias, srid=4326):
+    """
+    Convierte un array de geometrías shapely en EWKB hexadecimal con SRID,
+    que PostGIS acepta directamente como entrada de una columna geometry en COPY.
+    Los valores None se mantienen como None (NULL).
+    """
+    return shapely.to_wkb(shapely.set_srid(geometrias, srid), hex=True, include_srid=True)
+
+
+def copiar_filas(cursor, table_name, columnas, filas):
+    """
+    Carga filas en una tabla con COPY ... FROM STDIN en lugar de un INSERT por fila.
+
+    Las filas se copian directamente en la tabla destino (las geometrías deben
+    venir como WKT/EWKT o WKB/EWKB en hexadecimal).
+
+    Args:
+        cursor: Cursor pg8000 abierto.
+        table_name (str): Tabla destino.
+        columnas (list): Columnas destino, en el mismo orden que los valores de cada fila.
+        filas (iterable): Iterable de tuplas con los valores a cargar.
+
+    Returns:
+        int: Número de filas cargadas.
+    """
+    buffer, total = _a_texto_csv(filas)
+    if total == 0:
+        return 0
+
+    cursor.execute(
+        f"COPY {table_name} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)",
+        stream=buffer
+    )
+    return total
+
+
+def crear_tabla_nueva(cursor, table_name):
+    """
+    Crea una tabla temporal con la misma estructura que la tabla destino,
+    donde se copian las filas nuevas antes de aplicar las diferencias.
+
+    Returns:
+        str: Nombre de la tabla temporal.
+    """
+    tabla_nueva = f"tmp_nueva_{table_name}"
+    cursor.execute(f"DROP TABLE IF EXISTS {tabla_nueva};")
+    cursor.execute(f"CREATE TEMP TABLE {tabla_nueva} (LIKE {table_name}) ON COMMIT DROP;")
+    return tabla_nueva
+
+
+def aplicar_diferencias(cursor, table_name, tabla_nueva, columnas, clave):
+    """
+    Aplica sobre la tabla destino solo las diferencias con las filas de la
+    tabla temporal: inserta las claves nuevas, actualiza las filas que han
+    cambiado y borra las claves que ya no están en el origen. La tabla no se
+    recrea, así que sus índices y estadísticas se conservan.
+
+    La tabla destino debe tener un índice único sobre la clave.
+
+    Args:
+        cursor: Cursor pg8000 abierto.
+        table_name (str): Tabla destino.
+        tabla_nueva (str): Tabla temporal creada con crear_tabla_nueva.
+        columnas (list): Columnas destino.
+        clave (str): Columna con la clave natural del dataset.
+
+    Returns:
+        tuple: (filas insertadas o actualizadas, filas borradas)
+    """
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {tabla_nueva});")
+    if not cursor.fetchone()[0]:
+        # Un origen vacío suele ser un error de descarga: no se vacía la tabla
+        print(f"Tabla '{table_name}': el origen no tiene filas, se conservan los datos actuales.")
+        return 0, 0
+
+    cursor.execute(f"""
+        DELETE FROM {table_name} t
+        WHERE NOT EXISTS (SELECT 1 FROM {tabla_nueva} n WHERE n.{clave} = t.{clave});
+    """)
+    borradas = cursor.rowcount
+
+    lista_columnas = ", ".join(columnas)
+    resto = [columna for columna in columnas if columna != clave]
+    if resto:
+        conflicto = f"""DO UPDATE SET {", ".join(f"{columna} = EXCLUDED.{columna}" for columna in resto)}
+        WHERE ({", ".join(f"t.{columna}" for columna in resto)})
+            IS DISTINCT FROM ({", ".join(f"EXCLUDED.{columna}" for columna in resto)})"""
+    else:
+        conflicto = "DO NOTHING"
+    cursor.execute(f"""
+        INSERT INTO {table_name} AS t ({lista_columnas})
+        SELECT {lista_columnas} FROM {tabla_nueva}
+        ON CONFLICT ({clave}) {conflicto};
+    """)
+    return cursor.rowcount, borradas
+
+
+def intercambiar_tabla(cursor, table_name, tabla_nueva, espera_bloqueo="5s", reintentos=5):
+    """
+    Sustituye la tabla destino por una tabla nueva ya cargada, indexada y
+    analizada, renombrándola dentro de la transacción en curso. Los lectores
+    ven la generación anterior completa hasta el commit y la nueva después.
+
+    Los índices de la tabla nueva se renombran con el prefijo de la tabla
+    destino, para que la siguiente carga pueda volver a usar sus nombres.
+    Si el bloqueo no se obtiene en `espera_bloqueo` (hay consultas largas en
+    curso) se reintenta, en lugar de dejar en cola a los nuevos lectores.
+
+    Args:
+        cursor: Cursor pg8000 abierto.
+        table_name (str): Tabla destino; puede no existir todavía.
+        tabla_nueva (str): Tabla con la nueva generación de los datos.
+        espera_bloqueo (str): lock_timeout de PostgreSQL para cada intento.
+        reintentos (int): Número máximo de intentos.
+    """
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s;",
+        (tabla_nueva,)
+    )
+    indices = [fila[0] for fila in cursor.fetchall()]
+
+    for intento in range(1, reintentos + 1):
+        cursor.execute("SAVEPOINT intercambio;")
+        try:
+            cursor.execute(f"SET LOCAL lock_timeout = '{espera_bloqueo}';")
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+            cursor.execute(f"ALTER TABLE {tabla_nueva} RENAME TO {table_name};")
+            for indice in indices:
+                if indice.startswith(tabla_nueva):
+                    cursor.execute(f"ALTER INDEX {indice} RENAME TO {table_name}{indice[len(tabla_nueva):]};")
+            cursor.execute("RELEASE SAVEPOINT intercambio;")
+            return
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT intercambio;")
+            # 55P03: lock_not_available
+            if "55P03" not in str(e) or intento == reintentos:
+                raise
+            print(f"Tabla '{table_name}' ocupada, reintentando el intercambio ({intento}/{reintentos})...")
+            sleep(intento)
+
+
+def informe_carga(table_name, filas_cargadas, filas_rechazadas, inicio):
+    """
+    Imprime el resumen de una carga: filas cargadas, rechazadas y filas/segundo.
+
+    Args:
+        table_name (str): Tabla cargada.
+        filas_cargadas (int): Filas enviadas con COPY.
+        filas_rechazadas (int): Filas descartadas antes de la carga.
+        inicio (float): Instante de inicio obtenido con time.perf_counter().
+    """
+    segundos = perf_counter() - inicio
+    velocidad = filas_cargadas / segundos if segundos > 0 else float("inf")
+    print(
+        f"Tabla '{table_name}': {filas_cargadas} filas cargadas, "
+        f"{filas_rechazadas} rechazadas en {segundos:.2f}s ({velocidad:,.0f} filas/s)"
+    )
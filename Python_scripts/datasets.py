@@ -0,0 +1,289 @@
+import random  # Para generar valores aleatorios con probabilidades
+
+import pandas as pd
+
+# Registro declarativo de los datasets que se cargan en PostgreSQL.
+#
+# Cada entrada describe:
+#   origen        URL del CSV de datos abiertos o ruta local dentro del contenedor
+#   delimitador   delimitador del CSV
+#   tipos         (opcional) dtype para pd.read_csv
+#   numericas     (opcional) columna destino -> tipo numérico; los valores que no se pueden
+#                 convertir mandan la fila a la cuarentena en lugar de abortar la carga
+#   columnas      columna del CSV -> columna de la tabla destino
+#   geometria     (opcional) columna destino y parser de geometría (ver ingesta.PARSERS_GEOMETRIA)
+#   transformar   (opcional) función DataFrame -> DataFrame aplicada tras renombrar columnas
+#   por_lotes     (opcional) False si la transformación necesita todas las filas a la vez;
+#                 por defecto el CSV se parsea y se carga por lotes
+#   esquema       columnas de la tabla destino y su tipo SQL, en orden
+#   clave         (opcional) clave natural del dataset, usada para eliminar duplicados
+#   indices       (opcional) índices de la tabla: tuplas (método, columna, ...), por ejemplo
+#                 ("gist", "geo_point") o ("btree", "barrio"); se crean en cada carga
+#   barrio        (opcional) cómo se rellena la columna barrio_id de barrio_dim al cargar:
+#                 {"columna": ...} traduce el nombre del barrio de esa columna, con
+#                 "canonico": True en el dataset que define los barrios oficiales;
+#                 {"geometria": ...} asigna el barrio cuyo polígono contiene la geometría
+#   depende_de    (opcional) pasos que orquestador.py debe terminar antes de cargar este
+#
+# Añadir una nueva capa de datos abiertos consiste en añadir una entrada aquí.
+
+# Nombres que usan otras fuentes para un barrio de barrios_valencia -> nombre oficial.
+# Los nombres que solo difieren en mayúsculas, acentos o puntuación no hace falta
+# añadirlos: se comparan ya normalizados (ver normalizar_texto).
+ALIAS_BARRIOS = {
+    "Barrio de Favara": "FAVARA",
+    "Camí Reial": "CAMI REAL",
+    "El Cabanyal-El Canyamelar": "CABANYAL-CANYAMELAR",
+    "Fonteta de Sant Lluìs": "LA FONTETA S.LLUIS",
+    "Gran Vía": "LA GRAN VIA",
+    "Nou Benicalap": "BENICALAP",
+    "Nou Campanar": "CAMPANAR",
+    "Playa de la Malvarrosa": "LA MALVA-ROSA",
+    "Sant Llorenç": "SANT LLORENS",
+}
+
+
+def normalizar_texto(textos):
+    """
+    Normaliza una Serie de textos para compararlos entre fuentes (nombres de
+    barrio, regímenes...): minúsculas y sin acentos, como normalize_text en la
+    aplicación, y además solo letras y números
+    ("SANT MARCEL.LI" y "Sant Marcellí" -> "santmarcelli").
+    """
+    return (
+        textos.astype("string")
+        .str.lower()
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.replace(r"[^a-z0-9]", "", regex=True)
+    )
+
+
+def asignar_criminalidad(data):
+    """
+    Genera la columna 'criminalidad' con la distribución deseada.
+    """
+    data['criminalidad'] = random.choices(
+        population=[3, 2, 1, 0],  # Valores posibles
+        weights=[0.4, 0.3, 0.2, 0.1],  # Probabilidades asociadas
+        k=len(data)  # Número de valores a generar
+    )
+    return data
+
+
+def categorizar_precios(data):
+    """
+    Categoriza los precios en 3 niveles basados en los cuantiles de precio_2022.
+    """
+    data['precio_2022'] = pd.to_numeric(data['precio_2022'], errors='coerce')
+    data = data.dropna(subset=['barrio', 'precio_2022']).copy()
+
+    # Manejar caso de pocos datos únicos
+    if data['precio_2022'].nunique() < 3:
+        print("Advertencia: Pocos valores únicos para categorización de precios.")
+        categorias = pd.cut(data['precio_2022'], bins=3, labels=[1, 2, 3])
+    else:
+        categorias = pd.qcut(data['precio_2022'], q=3, labels=[1, 2, 3])
+
+    data['categoria_precio'] = categorias.astype(int)
+    return data
+
+
+# Régimen de los centros educativos -> código que se guarda en 'regimen_code'.
+# La aplicación filtra y colorea los centros por este código.
+CODIGOS_REGIMEN = {
+    "publico": 1,
+    "concertado": 2,
+    "privado": 3,
+}
+
+
+def codificar_regimen(data):
+    """
+    Genera la columna 'regimen_code' a partir del régimen normalizado igual que
+    los nombres de barrio ("PÚBLICO" -> "publico" -> 1). Los regímenes
+    desconocidos quedan como NULL.
+    """
+    data['regimen_code'] = normalizar_texto(data['regimen']).map(CODIGOS_REGIMEN).astype('Int16')
+    return data
+
+
+def normalizar_anuncios(data):
+    """
+    Normaliza las columnas booleanas de los anuncios de Idealista.
+    """
+    data['ascensor'] = data['ascensor'].map({'Sí': True, 'No': False})
+    data['parking'] = data['parking'].map({'Sí': True, 'No': False})
+    return data
+
+
+_COLUMNAS_ANUNCIOS = {
+    'Id del anuncio': 'id_anuncio',
+    'Tipo de inmueble': 'tipo_inmueble',
+    'Dirección': 'direccion',
+    'Precio': 'precio',
+    'Habitaciones': 'habitaciones',
+    'Baños': 'banos',
+    'Barrio': 'barrio',
+    'Ascensor (Sí/No)': 'ascensor',
+    'Parking (Sí/No)': 'parking',
+}
+
+# Los textos repetidos se leen como categorías; los números se validan en la carga
+_TIPOS_ANUNCIOS = {
+    'Tipo de inmueble': 'category',
+    'Barrio': 'category',
+}
+
+_NUMERICAS_ANUNCIOS = {
+    'id_anuncio': 'Int64',
+    'habitaciones': 'Int64',
+    'banos': 'Int64',
+    'precio': 'float64',
+}
+
+# Las consultas de rentabilidad filtran por características y agrupan por barrio
+_INDICES_ANUNCIOS = [
+    ("btree", "barrio_id"),
+    ("btree", "habitaciones", "banos", "ascensor", "parking"),
+]
+
+_BARRIO_ID = 'INTEGER REFERENCES barrio_dim (barrio_id)'
+
+_ESQUEMA_ANUNCIOS = {
+    'id_anuncio': 'BIGINT PRIMARY KEY',
+    'tipo_inmueble': 'TEXT',
+    'direccion': 'TEXT',
+    'precio': 'NUMERIC',
+    'habitaciones': 'INTEGER',
+    'banos': 'INTEGER',
+    'barrio': 'TEXT',
+    'barrio_id': _BARRIO_ID,
+    'ascensor': 'BOOLEAN',
+    'parking': 'BOOLEAN',
+}
+
+DATASETS = {
+    "centros_educativos": {
+        "origen": "https://valencia.opendatasoft.com/api/explore/v2.1/catalog/datasets/centros-educativos-en-valencia/exports/csv?lang=en&timezone=Europe%2FBerlin&use_labels=true&delimiter=%3B",
+        "delimitador": ";",
+        "columnas": {
+            'Geo Point': 'geo_point', 'Geo Shape': 'geo_shape', 'codcen': 'codcen',
+            'dlibre': 'dlibre', 'dgenerica_': 'dgenerica_', 'despecific': 'despecific',
+            'regimen': 'regimen', 'adrees': 'adrees', 'codpos': 'codpos',
+            'municipio_': 'municipio_', 'provincia_': 'provincia_', 'telef': 'telef',
+            'fax': 'fax', 'mail': 'mail',
+        },
+        "geometria": {"columna": "geo_point", "parser": "latlon"},
+        "transformar": codificar_regimen,
+        "esquema": {
+            'geo_point': 'geometry(Point, 4326)',
+            'geo_shape': 'TEXT',
+            'codcen': 'TEXT',
+            'dlibre': 'TEXT',
+            'dgenerica_': 'TEXT',
+            'despecific': 'TEXT',
+            'regimen': 'TEXT',
+            'regimen_code': 'SMALLINT',
+            'adrees': 'TEXT',
+            'codpos': 'TEXT',
+            'municipio_': 'TEXT',
+            'provincia_': 'TEXT',
+            'telef': 'TEXT',
+            'fax': 'TEXT',
+            'mail': 'TEXT',
+            'barrio_id': _BARRIO_ID,
+        },
+        "clave": "codcen",
+        "indices": [("gist", "geo_point"), ("btree", "barrio_id", "regimen_code")],
+        "barrio": {"geometria": "geo_point"},
+        "depende_de": ("barrios_valencia",),
+    },
+    "barrios_valencia": {
+        "origen": "https://valencia.opendatasoft.com/api/explore/v2.1/catalog/datasets/barris-barrios/exports/csv?lang=es&timezone=Europe%2FBerlin&use_labels=true&delimiter=%3B",
+        "delimitador": ";",
+        "columnas": {'Nombre': 'nombre', 'geo_shape': 'geo_shape'},
+        "geometria": {"columna": "geo_shape", "parser": "geojson"},
+        "transformar": asignar_criminalidad,
+        "esquema": {
+            'nombre': 'TEXT',
+            'barrio_id': _BARRIO_ID,
+            'geo_shape': 'geometry(Polygon, 4326)',
+            'criminalidad': 'INTEGER',
+        },
+        "clave": "nombre",
+        "indices": [("gist", "geo_shape"), ("btree", "barrio_id")],
+        "barrio": {"columna": "nombre", "canonico": True},
+    },
+    "paradas_metro": {
+        "origen": "https://valencia.opendatasoft.com/api/explore/v2.1/catalog/datasets/fgv-bocas/exports/csv?lang=es&timezone=Europe%2FBerlin&use_labels=true&delimiter=%3B",
+        "delimitador": ";",
+        "columnas": {'Denominació / Denominación': 'denominacion', 'geo_point_2d': 'geo_point_2d'},
+        "geometria": {"columna": "geo_point_2d", "parser": "latlon"},
+        "esquema": {
+            'denominacion': 'TEXT',
+            'geo_point_2d': 'geometry(Point, 4326)',
+            'barrio_id': _BARRIO_ID,
+        },
+        "indices": [("gist", "geo_point_2d"), ("btree", "barrio_id")],
+        "barrio": {"geometria": "geo_point_2d"},
+        "depende_de": ("barrios_valencia",),
+    },
+    "zonas_infantiles": {
+        "origen": "https://valencia.opendatasoft.com/api/explore/v2.1/catalog/datasets/zones-jocs-infantils-zona-juegos-infantiles/exports/csv?lang=es&timezone=Europe%2FBerlin&use_labels=true&delimiter=%3B",
+        "delimitador": ";",
+        "columnas": {'Jardin': 'jardin', 'geo_point_2d': 'geo_point_2d'},
+        "geometria": {"columna": "geo_point_2d", "parser": "latlon"},
+        "esquema": {
+            'jardin': 'TEXT',
+            'geo_point_2d': 'geometry(Point, 4326)',
+            'barrio_id': _BARRIO_ID,
+        },
+        "indices": [("gist", "geo_point_2d"), ("btree", "barrio_id")],
+        "barrio": {"geometria": "geo_point_2d"},
+        "depende_de": ("barrios_valencia",),
+    },
+    "precios_barrios": {
+        "origen": "https://valencia.opendatasoft.com/api/explore/v2.1/catalog/datasets/precio-de-compra-en-idealista/exports/csv?lang=es&timezone=Europe%2FBerlin&use_labels=true&delimiter=%3B",
+        "delimitador": ";",
+        "columnas": {'BARRIO': 'barrio', 'Precio_2022 (Euros/m2)': 'precio_2022'},
+        "transformar": categorizar_precios,
+        "por_lotes": False,  # Los cuantiles se calculan sobre todos los barrios
+        "esquema": {
+            'barrio': 'TEXT',
+            'barrio_id': _BARRIO_ID,
+            'precio_2022': 'FLOAT',
+            'categoria_precio': 'INTEGER',
+        },
+        "indices": [("btree", "barrio_id")],
+        "barrio": {"columna": "barrio"},
+        "depende_de": ("barrios_valencia",),
+    },
+    "alquileres": {
+        "origen": "/app/IdeaDatos/alquiler_total .csv",
+        "delimitador": ";",
+        "tipos": _TIPOS_ANUNCIOS,
+        "numericas": _NUMERICAS_ANUNCIOS,
+        "columnas": _COLUMNAS_ANUNCIOS,
+        "transformar": normalizar_anuncios,
+        "esquema": _ESQUEMA_ANUNCIOS,
+        "clave": "id_anuncio",
+        "indices": _INDICES_ANUNCIOS,
+        "barrio": {"columna": "barrio"},
+        "depende_de": ("barrios_valencia",),
+    },
+    "compras": {
+        "origen": "/app/IdeaDatos/compras_total .csv",
+        "delimitador": ";",
+        "tipos": _TIPOS_ANUNCIOS,
+        "numericas": _NUMERICAS_ANUNCIOS,
+        "columnas": _COLUMNAS_ANUNCIOS,
+        "transformar": normalizar_anuncios,
+        "esquema": _ESQUEMA_ANUNCIOS,
+        "clave": "id_anuncio",
+        "indices": _INDICES_ANUNCIOS,
+        "barrio": {"columna": "barrio"},
+        "depende_de": ("barrios_valencia",),
+    },
+}
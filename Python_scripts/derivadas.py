@@ -0,0 +1,179 @@
+import hashlib
+import math
+import sys
+from time import perf_counter
+
+import pg8000
+
+from carga_masiva import informe_carga, intercambiar_tabla
+from datasets import CODIGOS_REGIMEN
+from ingesta import CONFIG_DB, crear_indices, incrementar_version, leer_entradas, verificar_indices
+
+# Registro de las tablas derivadas que se construyen en PostgreSQL a partir
+# de los datasets ya cargados.
+#
+# Cada entrada describe:
+#   consulta      SELECT que produce el contenido de la tabla; los puntos se cuentan por
+#                 el barrio_id asignado al cargarlos, sin joins espaciales, y el polígono
+#                 se guarda además simplificado para cada zoom de ZOOMS_SIMPLIFICADOS
+#   depende_de    pasos que orquestador.py debe terminar antes de construirla
+#   indices       (opcional) igual que en datasets.py
+#
+# La tabla se construye en '<tabla>_nueva' y se intercambia con la actual,
+# como las recargas completas de los datasets. Si ninguno de los pasos de
+# depende_de ha cargado datos nuevos desde la última construcción (y la
+# definición no ha cambiado), no se reconstruye.
+
+# Zooms del mapa para los que barrio_features guarda el polígono simplificado en la
+# columna 'geo_shape_z<zoom>'; la aplicación usa el primer nivel que cubre su zoom
+# y el polígono completo por encima del último.
+ZOOMS_SIMPLIFICADOS = (12, 14, 16)
+
+# Latitud de Valencia, para pasar píxeles de Web Mercator a grados
+_LATITUD = 39.47
+
+
+def _tolerancia(zoom):
+    """
+    Tolerancia de simplificación, en grados, equivalente a medio píxel del mapa
+    al zoom dado. Los vértices se desplazan menos de medio píxel, así que los
+    huecos entre barrios vecinos, simplificados por separado, no llegan a verse.
+    """
+    grados_por_pixel = 360 / (256 * 2 ** zoom) * math.cos(math.radians(_LATITUD))
+    return grados_por_pixel / 2
+
+
+_SIMPLIFICADAS = ",\n                ".join(
+    f"ST_SimplifyPreserveTopology(b.geo_shape, {_tolerancia(zoom):.8f}) AS geo_shape_z{zoom}"
+    for zoom in ZOOMS_SIMPLIFICADOS
+)
+
+
+DERIVADAS = {
+    "barrio_features": {
+        "consulta": f"""
+            SELECT
+                b.barrio_id,
+                b.nombre,
+                b.criminalidad,
+                precio.categoria_precio,
+                COALESCE(metro.paradas, 0) AS paradas_metro,
+                COALESCE(centros.publicos, 0) AS centros_publicos,
+                COALESCE(centros.concertados, 0) AS centros_concertados,
+                COALESCE(centros.privados, 0) AS centros_privados,
+                COALESCE(zonas.zonas, 0) AS zonas_infantiles,
+                ST_Area(b.geo_shape::geography) AS area_m2,
+                ST_Centroid(b.geo_shape) AS centroide,
+                b.geo_shape,
+                {_SIMPLIFICADAS}
+            FROM barrios_valencia b
+            LEFT JOIN LATERAL (
+                SELECT MIN(p.categoria_precio) AS categoria_precio
+                FROM precios_barrios p
+                WHERE p.barrio_id = b.barrio_id
+            ) precio ON TRUE
+            LEFT JOIN (
+                SELECT barrio_id, COUNT(*) AS paradas
+                FROM paradas_metro
+                GROUP BY barrio_id
+            ) metro ON metro.barrio_id = b.barrio_id
+            LEFT JOIN (
+                SELECT
+                    c.barrio_id,
+                    COUNT(*) FILTER (WHERE c.regimen_code = {CODIGOS_REGIMEN['publico']}) AS publicos,
+                    COUNT(*) FILTER (WHERE c.regimen_code = {CODIGOS_REGIMEN['concertado']}) AS concertados,
+                    COUNT(*) FILTER (WHERE c.regimen_code = {CODIGOS_REGIMEN['privado']}) AS privados
+                FROM centros_educativos c
+                GROUP BY c.barrio_id
+            ) centros ON centros.barrio_id = b.barrio_id
+            LEFT JOIN (
+                SELECT barrio_id, COUNT(*) AS zonas
+                FROM zonas_infantiles
+                GROUP BY barrio_id
+            ) zonas ON zonas.barrio_id = b.barrio_id
+        """,
+        "depende_de": (
+            "barrios_valencia", "precios_barrios", "paradas_metro",
+            "centros_educativos", "zonas_infantiles",
+        ),
+        "indices": [
+            ("btree", "barrio_id"),
+            ("btree", "criminalidad", "categoria_precio"),
+            ("gist", "geo_shape"),
+        ],
+    },
+}
+
+
+def _entradas(cursor, spec):
+    """
+    Devuelve las versiones de los pasos de los que depende la tabla y un
+    resumen de su definición, que es lo que decide si hay que reconstruirla.
+    """
+    cursor.execute(
+        "SELECT tabla, version FROM ingesta_versiones WHERE tabla = ANY(%s);",
+        (list(spec["depende_de"]),)
+    )
+    versiones = {tabla: version for tabla, version in cursor.fetchall()}
+    definicion = hashlib.sha256(repr((spec["consulta"], spec.get("indices"))).encode()).hexdigest()
+    return {"versiones": versiones, "definicion": definicion}
+
+
+def construir_derivada(nombre, db_config=CONFIG_DB, forzar=False):
+    """
+    Construye una tabla derivada del registro y la intercambia con la actual.
+
+    Args:
+        nombre (str): Nombre de la tabla en DERIVADAS.
+        db_config (dict): Configuración de la conexión a PostgreSQL.
+        forzar (bool): Construye la tabla aunque sus entradas no hayan cambiado.
+
+    Returns:
+        bool: True si la tabla se construye correctamente o no es necesario.
+    """
+    spec = DERIVADAS[nombre]
+    tabla_nueva = f"{nombre}_nueva"
+    conn = None
+    cursor = None
+    try:
+        inicio = perf_counter()
+        conn = pg8000.connect(**db_config)
+        cursor = conn.cursor()
+
+        entradas = _entradas(cursor, spec)
+        cursor.execute("SELECT to_regclass(%s);", (nombre,))
+        existe = cursor.fetchone()[0] is not None
+        if not forzar and existe and leer_entradas(cursor, nombre) == entradas:
+            print(f"Tabla '{nombre}': sus entradas no han cambiado, no se reconstruye.")
+            return True
+
+        cursor.execute(f"DROP TABLE IF EXISTS {tabla_nueva};")
+        cursor.execute(f"CREATE TABLE {tabla_nueva} AS {spec['consulta']};")
+        filas = cursor.rowcount
+        crear_indices(cursor, tabla_nueva, spec)
+        cursor.execute(f"ANALYZE {tabla_nueva};")
+        intercambiar_tabla(cursor, nombre, tabla_nueva)
+        verificar_indices(cursor, nombre, spec)
+        incrementar_version(cursor, nombre, entradas)
+
+        conn.commit()
+        informe_carga(nombre, filas, 0, inicio)
+        return True
+
+    except Exception as e:
+        print(f"Error al construir la tabla derivada '{nombre}': {e}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# Construir las tablas indicadas o, si no se indica ninguna, todas
+if __name__ == "__main__":
+    nombres = sys.argv[1:] or list(DERIVADAS)
+    resultados = [construir_derivada(nombre) for nombre in nombres]
+    sys.exit(0 if all(resultados) else 1)
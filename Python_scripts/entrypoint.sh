@@ -1,29 +1,12 @@
 #!/bin/sh
 set -e  # Detiene el script si ocurre algún error
 
-echo "Ejecutando script.py..."
-python script.py
-
-echo "Ejecutando barrios.py..."
-python scriptbarrios.py
-
-echo "Ejecutando metros..."
-python scriptmetro.py 
-
-echo "Ejecutando compras..."
-python scriptcompras.py
-
-echo "Ejecutando precios..."
-python scriptprecios.py
-
-echo "Ejecutando alquileres..."
-python scriptalquileres.py
-
-echo "Ejecutando demanda..."
-python scriptdemanda.py
-
-echo "Ejecutando parques infantiles"
-python scriptjuegos.py
-
-# Mantener el contenedor activo después de ejecutar los scripts
-tail -f /dev/null
\ No newline at end of file
+# Espera a PostgreSQL/PostGIS y ejecuta todas las cargas en paralelo,
+# respetando las dependencias declaradas en datasets.py
+echo "Ejecutando orquestador de la ingesta..."
+python orquestador.py || echo "La ingesta ha terminado con errores; se continúa con el mantenimiento."
+
+# Mantener el contenedor activo con el mantenimiento periódico de la tabla
+# 'demanda' (particiones de los próximos meses y retención)
+echo "Iniciando el mantenimiento periódico de la tabla demanda..."
+exec python scriptdemanda.py --mantener
@@ -0,0 +1,765 @@
+import hashlib
+import io
+import json
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+import pg8000
+import requests
+import shapely
+
+from carga_masiva import (
+    aplicar_diferencias,
+    copiar_filas,
+    crear_tabla_nueva,
+    ewkb_hex,
+    informe_carga,
+    intercambiar_tabla,
+)
+from datasets import ALIAS_BARRIOS, DATASETS, normalizar_texto
+
+# Configuración
+CONFIG_DB = {
+    "host": "postgres",  # Nombre del servicio definido en docker-compose
+    "port": 5432,
+    "database": "postgres",
+    "user": "postgres",
+    "password": "postgres",
+}
+
+# Dataset que define los barrios oficiales y sus polígonos
+TABLA_BARRIOS = next(
+    nombre for nombre, spec in DATASETS.items() if spec.get("barrio", {}).get("canonico")
+)
+
+# Filas por lote al parsear el CSV y bytes por bloque al descargarlo
+TAMANO_LOTE = 50_000
+TAMANO_BLOQUE = 1 << 16
+
+
+def descargar_csv(url, cabeceras=None):
+    """
+    Descarga el contenido CSV desde la URL proporcionada.
+
+    Args:
+        url (str): URL del archivo CSV.
+        cabeceras (dict, opcional): Cabeceras HTTP de la petición, por ejemplo
+            If-None-Match/If-Modified-Since para una descarga condicional.
+
+    Returns:
+        requests.Response: Respuesta en streaming (200 con el contenido sin leer
+            o 304 sin cambios) o None si falla.
+    """
+    try:
+        response = requests.get(url, headers=cabeceras, stream=True)
+        response.raise_for_status()
+        return response
+    except requests.exceptions.RequestException as e:
+        print(f"Error al descargar el archivo: {e}")
+        return None
+
+
+def _parsear_latlon(valores):
+    """
+    Convierte textos "lat,lon" en puntos EWKB, operando sobre la columna entera.
+
+    Las filas sin valor quedan con geometría NULL; las que no se pueden
+    parsear o tienen coordenadas fuera de rango se rechazan.
+
+    Returns:
+        tuple: (Serie con el EWKB de cada fila, máscara de filas rechazadas)
+    """
+    partes = valores.astype("string").str.split(",", n=1, expand=True).reindex(columns=[0, 1])
+    latitud = pd.to_numeric(partes[0].str.strip(), errors="coerce").astype(float)
+    longitud = pd.to_numeric(partes[1].str.strip(), errors="coerce").astype(float)
+    validas = latitud.between(-90, 90) & longitud.between(-180, 180)
+
+    geometrias = np.full(len(valores), None, dtype=object)
+    geometrias[validas.to_numpy()] = shapely.points(longitud[validas].to_numpy(), latitud[validas].to_numpy())
+    return pd.Series(ewkb_hex(geometrias), index=valores.index), valores.notna() & ~validas
+
+
+def _parsear_geojson(valores):
+    """
+    Convierte textos GeoJSON en geometrías EWKB, operando sobre la columna entera.
+
+    Las filas sin valor o con un GeoJSON no válido se rechazan.
+
+    Returns:
+        tuple: (Serie con el EWKB de cada fila, máscara de filas rechazadas)
+    """
+    presentes = valores.notna().to_numpy()
+    geometrias = np.full(len(valores), None, dtype=object)
+    geometrias[presentes] = shapely.from_geojson(valores[presentes].to_numpy(), on_invalid="ignore")
+    rechazadas = pd.Series(shapely.is_missing(geometrias), index=valores.index)
+    return pd.Series(ewkb_hex(geometrias), index=valores.index), rechazadas
+
+
+# Parser de geometría -> función de parseo que devuelve EWKB listo para COPY
+PARSERS_GEOMETRIA = {
+    "latlon": _parsear_latlon,
+    "geojson": _parsear_geojson,
+}
+
+
+def crear_tablas_metadatos(cursor):
+    """
+    Crea las tablas compartidas por todas las cargas: la huella de la última
+    carga de cada dataset, la versión de los datos de cada tabla, las filas
+    rechazadas (cuarentena) y la dimensión de barrios con sus alias.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingesta_huellas (
+            dataset TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            sha256 TEXT,
+            actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingesta_versiones (
+            tabla TEXT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            entradas JSONB,
+            actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingesta_cuarentena (
+            id SERIAL PRIMARY KEY,
+            dataset TEXT,
+            motivo TEXT,
+            fila JSONB,
+            registrado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS barrio_dim (
+            barrio_id SERIAL PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            nombre_normalizado TEXT NOT NULL UNIQUE
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS barrio_alias (
+            alias TEXT PRIMARY KEY,
+            barrio_id INTEGER NOT NULL REFERENCES barrio_dim (barrio_id)
+        );
+    """)
+
+
+def leer_huella(cursor, nombre):
+    """
+    Devuelve la huella de la última carga del dataset o None si no hay ninguna.
+
+    La huella es un dict con el ETag y el Last-Modified de la respuesta HTTP
+    y el sha256 del contenido.
+    """
+    crear_tablas_metadatos(cursor)
+    cursor.execute("SELECT etag, last_modified, sha256 FROM ingesta_huellas WHERE dataset = %s;", (nombre,))
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    return {"etag": fila[0], "last_modified": fila[1], "sha256": fila[2]}
+
+
+def guardar_huella(cursor, nombre, huella):
+    cursor.execute("""
+        INSERT INTO ingesta_huellas (dataset, etag, last_modified, sha256, actualizado_en)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (dataset) DO UPDATE SET
+            etag = EXCLUDED.etag,
+            last_modified = EXCLUDED.last_modified,
+            sha256 = EXCLUDED.sha256,
+            actualizado_en = EXCLUDED.actualizado_en;
+    """, (nombre, huella["etag"], huella["last_modified"], huella["sha256"]))
+
+
+def incrementar_version(cursor, tabla, entradas=None):
+    """
+    Incrementa la versión de los datos de la tabla en 'ingesta_versiones'.
+
+    Se llama en la misma transacción que la carga, así que la aplicación ve
+    la versión nueva a la vez que los datos y puede usarla como clave de caché.
+    Las tablas derivadas guardan en 'entradas' de qué versiones se construyeron.
+    """
+    cursor.execute("""
+        INSERT INTO ingesta_versiones (tabla, version, entradas, actualizado_en)
+        VALUES (%s, 1, CAST(%s AS JSONB), CURRENT_TIMESTAMP)
+        ON CONFLICT (tabla) DO UPDATE SET
+            version = ingesta_versiones.version + 1,
+            entradas = EXCLUDED.entradas,
+            actualizado_en = EXCLUDED.actualizado_en;
+    """, (tabla, json.dumps(entradas) if entradas is not None else None))
+
+
+def leer_entradas(cursor, tabla):
+    """
+    Devuelve las entradas con las que se generó la versión actual de la tabla
+    o None si no se guardaron.
+    """
+    cursor.execute("SELECT entradas FROM ingesta_versiones WHERE tabla = %s;", (tabla,))
+    fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+class _LectorConHuella(io.RawIOBase):
+    """
+    Flujo binario de solo lectura sobre un iterable de bloques de bytes que
+    calcula el sha256 del contenido a medida que se consume.
+
+    Al llegar al final del flujo deja el sha256 en huella["sha256"].
+    """
+
+    def __init__(self, bloques, huella, cerrar=None):
+        self._bloques = iter(bloques)
+        self._pendiente = memoryview(b"")
+        self._sha256 = hashlib.sha256()
+        self._huella = huella
+        self._cerrar = cerrar
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        while not self._pendiente:
+            bloque = next(self._bloques, None)
+            if bloque is None:
+                self._huella["sha256"] = self._sha256.hexdigest()
+                return 0
+            self._sha256.update(bloque)
+            self._pendiente = memoryview(bloque)
+        n = min(len(destino), len(self._pendiente))
+        destino[:n] = self._pendiente[:n]
+        self._pendiente = self._pendiente[n:]
+        return n
+
+    def close(self):
+        if self._cerrar and not self.closed:
+            self._cerrar()
+        super().close()
+
+
+def _bloques_fichero(fichero):
+    return iter(lambda: fichero.read(TAMANO_BLOQUE), b"")
+
+
+def obtener_origen(spec, huella_anterior=None):
+    """
+    Abre el origen de un dataset (URL o ruta local) como flujo binario.
+
+    Para las URLs se hace una petición condicional con el ETag/Last-Modified
+    de la carga anterior y el sha256 de la huella se completa cuando se ha
+    leído todo el flujo. Los ficheros locales se resumen antes de abrirlos,
+    así que un fichero sin cambios no llega a parsearse.
+
+    Returns:
+        tuple: (flujo binario, huella), (None, huella) si el origen no ha
+            cambiado (304 o mismo sha256 del fichero local), o (None, None)
+            si la descarga falla.
+    """
+    origen = spec["origen"]
+    huella = {"etag": None, "last_modified": None, "sha256": None}
+    if origen.startswith(("http://", "https://")):
+        cabeceras = {}
+        if huella_anterior and huella_anterior["etag"]:
+            cabeceras["If-None-Match"] = huella_anterior["etag"]
+        if huella_anterior and huella_anterior["last_modified"]:
+            cabeceras["If-Modified-Since"] = huella_anterior["last_modified"]
+        response = descargar_csv(origen, cabeceras)
+        if response is None:
+            return None, None
+        if response.status_code == 304:
+            response.close()
+            return None, huella_anterior
+        huella["etag"] = response.headers.get("ETag")
+        huella["last_modified"] = response.headers.get("Last-Modified")
+        bloques = response.iter_content(chunk_size=TAMANO_BLOQUE)
+        return _LectorConHuella(bloques, huella, cerrar=response.close), huella
+
+    sha256 = hashlib.sha256()
+    with open(origen, "rb") as fichero:
+        for bloque in _bloques_fichero(fichero):
+            sha256.update(bloque)
+    huella["sha256"] = sha256.hexdigest()
+    if huella_anterior and huella_anterior["sha256"] == huella["sha256"]:
+        return None, huella
+    return open(origen, "rb", buffering=0), huella
+
+
+def leer_origen(flujo, spec):
+    """
+    Parsea el CSV de un dataset por lotes de TAMANO_LOTE filas.
+
+    Los datasets con "por_lotes": False se leen en un único DataFrame porque
+    su transformación necesita todas las filas.
+
+    Returns:
+        iterable de DataFrames.
+    """
+    texto = io.TextIOWrapper(io.BufferedReader(flujo), encoding="utf-8", newline="")
+    por_lotes = spec.get("por_lotes", True)
+    lotes = pd.read_csv(
+        texto,
+        delimiter=spec.get("delimitador", ";"),
+        dtype=spec.get("tipos"),
+        chunksize=TAMANO_LOTE if por_lotes else None
+    )
+    return lotes if por_lotes else [lotes]
+
+
+def validar(data, spec):
+    """
+    Convierte las columnas declaradas en "numericas" y separa las filas que no
+    se pueden cargar: valores que no son números (o enteros, si el tipo es
+    entero) y filas sin clave natural.
+
+    Returns:
+        tuple: (DataFrame con las filas válidas, DataFrame con las rechazadas y su motivo)
+    """
+    motivos = pd.Series(None, index=data.index, dtype=object)
+    convertidas = {}
+    for columna, tipo in spec.get("numericas", {}).items():
+        valores = pd.to_numeric(data[columna], errors="coerce")
+        no_validos = valores.isna() & data[columna].notna()
+        if pd.api.types.is_integer_dtype(pd.api.types.pandas_dtype(tipo)):
+            no_validos |= valores.notna() & (valores % 1 != 0)
+        motivos = motivos.mask(motivos.isna() & no_validos, f"valor no válido en '{columna}'")
+        convertidas[columna] = valores.mask(no_validos)
+
+    clave = spec.get("clave")
+    if clave:
+        motivos = motivos.mask(motivos.isna() & data[clave].isna(), f"sin valor en la clave '{clave}'")
+
+    rechazadas = motivos.notna()
+    cuarentena = data[rechazadas].assign(motivo=motivos[rechazadas])
+    data = data[~rechazadas].assign(**{
+        columna: valores[~rechazadas].astype(spec["numericas"][columna])
+        for columna, valores in convertidas.items()
+    })
+    return data, cuarentena
+
+
+def transformar(data, spec, claves_vistas=None):
+    """
+    Selecciona y renombra las columnas, valida los valores, aplica la
+    transformación del dataset y parsea la geometría.
+
+    Args:
+        data (DataFrame): Lote leído del origen.
+        spec (dict): Definición del dataset.
+        claves_vistas (set, opcional): Claves de lotes anteriores; se descartan
+            los duplicados entre lotes y se añaden las claves de este lote.
+
+    Returns:
+        tuple: (DataFrame con las columnas del esquema destino,
+            DataFrame con las filas rechazadas y su motivo)
+    """
+    data = data[list(spec["columnas"])].rename(columns=spec["columnas"])
+    data, cuarentena = validar(data, spec)
+
+    clave = spec.get("clave")
+    if clave:
+        data = data.drop_duplicates(subset=[clave])
+        if claves_vistas is not None:
+            data = data[~data[clave].isin(claves_vistas)]
+            claves_vistas.update(data[clave])
+
+    if spec.get("transformar"):
+        data = spec["transformar"](data)
+
+    geometria = spec.get("geometria")
+    if geometria:
+        parser = PARSERS_GEOMETRIA[geometria["parser"]]
+        columna = geometria["columna"]
+        geometrias, rechazadas = parser(data[columna])
+        cuarentena = pd.concat([cuarentena, data[rechazadas].assign(motivo=f"geometría no válida en '{columna}'")])
+        data = data[~rechazadas].assign(**{columna: geometrias[~rechazadas]})
+
+    # Las columnas que no vienen del origen (barrio_id) se rellenan después
+    return data.reindex(columns=list(spec["esquema"])), cuarentena
+
+
+def registrar_barrios(cursor, nombres):
+    """
+    Da de alta en barrio_dim los barrios oficiales que aún no están, sin
+    cambiar el barrio_id de los existentes, y registra en barrio_alias su
+    nombre normalizado y los alias de ALIAS_BARRIOS.
+
+    Args:
+        cursor: Cursor pg8000 abierto.
+        nombres (Series): Nombres oficiales de los barrios.
+    """
+    nombres = nombres.dropna()
+    cursor.execute("""
+        INSERT INTO barrio_dim (nombre, nombre_normalizado)
+        SELECT * FROM unnest(%s::text[], %s::text[])
+        ON CONFLICT (nombre_normalizado) DO UPDATE SET nombre = EXCLUDED.nombre;
+    """, (nombres.tolist(), normalizar_texto(nombres).tolist()))
+
+    alias = pd.Series(list(ALIAS_BARRIOS))
+    oficiales = pd.Series(list(ALIAS_BARRIOS.values()))
+    cursor.execute("""
+        INSERT INTO barrio_alias (alias, barrio_id)
+        SELECT nombre_normalizado, barrio_id FROM barrio_dim
+        UNION ALL
+        SELECT a.alias, d.barrio_id
+        FROM unnest(%s::text[], %s::text[]) AS a (alias, oficial)
+        JOIN barrio_dim d ON d.nombre_normalizado = a.oficial
+        ON CONFLICT (alias) DO UPDATE SET barrio_id = EXCLUDED.barrio_id;
+    """, (normalizar_texto(alias).tolist(), normalizar_texto(oficiales).tolist()))
+
+
+def leer_ids_barrio(cursor):
+    """
+    Devuelve el diccionario alias normalizado -> barrio_id.
+    """
+    cursor.execute("SELECT alias, barrio_id FROM barrio_alias;")
+    return dict(cursor.fetchall())
+
+
+def asignar_barrio_id(data, columna, ids_barrio, nombre):
+    """
+    Rellena la columna barrio_id a partir del nombre del barrio en `columna`.
+    Los barrios que no están en barrio_dim ni en sus alias quedan con NULL.
+
+    Si la columna es categórica se normalizan solo sus categorías.
+    """
+    nombres = data[columna]
+    if isinstance(nombres.dtype, pd.CategoricalDtype):
+        ids = normalizar_texto(pd.Series(nombres.cat.categories)).map(ids_barrio)
+        data["barrio_id"] = ids.astype("Int64").reindex(nombres.cat.codes.to_numpy()).set_axis(data.index)
+    else:
+        data["barrio_id"] = normalizar_texto(nombres).map(ids_barrio).astype("Int64")
+    sin_barrio = data.loc[data[columna].notna() & data["barrio_id"].isna(), columna].unique()
+    if len(sin_barrio):
+        print(f"Tabla '{nombre}': barrios sin correspondencia en barrio_dim: {', '.join(map(str, sin_barrio))}")
+    return data
+
+
+def asignar_barrio_espacial(cursor, table_name, columna):
+    """
+    Rellena barrio_id con el barrio cuyo polígono contiene la geometría de
+    cada fila, con un único UPDATE y un join espacial que usa el índice GiST
+    de los barrios.
+    """
+    columna_barrios = DATASETS[TABLA_BARRIOS]["geometria"]["columna"]
+    cursor.execute(f"""
+        UPDATE {table_name} p
+        SET barrio_id = b.barrio_id
+        FROM {TABLA_BARRIOS} b
+        WHERE ST_Within(p.{columna}, b.{columna_barrios});
+    """)
+    print(f"Tabla '{table_name}': {cursor.rowcount} filas con barrio asignado.")
+
+
+def _entradas_barrio(cursor, spec):
+    """
+    Devuelve la versión de los barrios con la que se asigna el barrio_id por
+    geometría, o None si el dataset no lo asigna así.
+    """
+    barrio = spec.get("barrio")
+    if not barrio or "geometria" not in barrio:
+        return None
+    cursor.execute("SELECT version FROM ingesta_versiones WHERE tabla = %s;", (TABLA_BARRIOS,))
+    fila = cursor.fetchone()
+    return {TABLA_BARRIOS: fila[0] if fila else 0}
+
+
+def reasignar_barrio_espacial(cursor, table_name, spec, entradas):
+    """
+    Vuelve a asignar el barrio_id de la tabla actual cuando los barrios han
+    cambiado aunque el origen del dataset no, e incrementa su versión.
+    """
+    cursor.execute(f"UPDATE {table_name} SET barrio_id = NULL WHERE barrio_id IS NOT NULL;")
+    asignar_barrio_espacial(cursor, table_name, spec["barrio"]["geometria"])
+    cursor.execute(f"ANALYZE {table_name};")
+    incrementar_version(cursor, table_name, entradas)
+
+
+def _preparar_lotes(cursor, flujo, nombre, spec):
+    """
+    Lee, transforma y asigna el barrio_id de cada lote del origen.
+
+    Yields:
+        tuple: (DataFrame transformado, DataFrame en cuarentena)
+    """
+    claves_vistas = set() if spec.get("clave") else None
+    barrio = spec.get("barrio")
+    por_nombre = barrio is not None and "columna" in barrio
+    ids_barrio = leer_ids_barrio(cursor) if por_nombre else None
+    for lote in leer_origen(flujo, spec):
+        data, cuarentena = transformar(lote, spec, claves_vistas)
+        if por_nombre:
+            if barrio.get("canonico"):
+                registrar_barrios(cursor, data[barrio["columna"]])
+                ids_barrio = leer_ids_barrio(cursor)
+            data = asignar_barrio_id(data, barrio["columna"], ids_barrio, nombre)
+        yield data, cuarentena
+
+
+def poner_en_cuarentena(cursor, nombre, cuarentena):
+    """
+    Guarda en 'ingesta_cuarentena' las filas rechazadas de un lote, con su
+    motivo y la fila original en JSON.
+
+    Returns:
+        int: Número de filas guardadas.
+    """
+    if cuarentena.empty:
+        return 0
+    filas_json = cuarentena.drop(columns="motivo").to_json(
+        orient="records", lines=True, force_ascii=False, default_handler=str
+    ).splitlines()
+    print(f"Tabla '{nombre}': {len(filas_json)} filas en cuarentena.")
+    return copiar_filas(
+        cursor,
+        "ingesta_cuarentena",
+        ["dataset", "motivo", "fila"],
+        zip([nombre] * len(filas_json), cuarentena["motivo"], filas_json)
+    )
+
+
+def _columnas_tabla(cursor, table_name):
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+        ORDER BY ordinal_position;
+    """, (table_name,))
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def crear_tabla(cursor, table_name, spec):
+    """
+    Recrea una tabla a partir del esquema del dataset, con un índice único
+    sobre la clave natural si la tiene.
+    """
+    cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+    definicion = ",\n            ".join(f"{columna} {tipo}" for columna, tipo in spec["esquema"].items())
+    cursor.execute(f"""
+        CREATE TABLE {table_name} (
+            {definicion}
+        );
+    """)
+    _asegurar_indice_clave(cursor, table_name, spec)
+
+
+def _asegurar_indice_clave(cursor, table_name, spec):
+    clave = spec.get("clave")
+    if clave and "PRIMARY KEY" not in spec["esquema"][clave].upper():
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {table_name}_{clave}_key ON {table_name} ({clave});")
+
+
+def _nombre_indice(table_name, columnas):
+    return f"{table_name}_{'_'.join(columnas)}_idx"
+
+
+def crear_indices(cursor, table_name, spec):
+    """
+    Crea los índices declarados en el campo "indices" del dataset, si no existen.
+    """
+    for metodo, *columnas in spec.get("indices", ()):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {_nombre_indice(table_name, columnas)} "
+            f"ON {table_name} USING {metodo} ({', '.join(columnas)});"
+        )
+
+
+def verificar_indices(cursor, table_name, spec):
+    """
+    Comprueba en pg_indexes que la tabla tiene todos los índices declarados.
+
+    Raises:
+        RuntimeError: Si falta alguno.
+    """
+    cursor.execute(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s;",
+        (table_name,)
+    )
+    existentes = {fila[0] for fila in cursor.fetchall()}
+    faltan = [
+        _nombre_indice(table_name, columnas)
+        for _, *columnas in spec.get("indices", ())
+        if _nombre_indice(table_name, columnas) not in existentes
+    ]
+    if faltan:
+        raise RuntimeError(f"Faltan índices en la tabla '{table_name}': {', '.join(faltan)}")
+
+
+def cargar(cursor, lotes, table_name, spec, sin_cambios=None):
+    """
+    Carga los lotes transformados con COPY sin que los lectores de la tabla
+    destino vean nunca una carga a medias.
+
+    Si la tabla existe con el mismo esquema y el dataset tiene clave natural,
+    los lotes se copian a una tabla temporal y se aplican solo las
+    diferencias en la transacción de la carga. En otro caso se carga una
+    tabla '<tabla>_nueva', se indexa, se analiza y se intercambia con la actual.
+    En ambos casos se comprueban después los índices declarados.
+
+    Args:
+        cursor: Cursor pg8000 abierto.
+        lotes (iterable): Tuplas (DataFrame transformado, DataFrame en cuarentena).
+        table_name (str): Tabla destino.
+        spec (dict): Definición del dataset.
+        sin_cambios (callable): Se llama al terminar de leer los lotes; si
+            devuelve True el origen no ha cambiado y no se toca la tabla destino.
+
+    Returns:
+        tuple: (filas cargadas, filas rechazadas), o None si el origen no ha cambiado.
+    """
+    columnas = list(spec["esquema"])
+    clave = spec.get("clave")
+    columnas_actuales = _columnas_tabla(cursor, table_name)
+    existe = bool(columnas_actuales)
+    diferencias = bool(clave) and columnas_actuales == columnas
+
+    if diferencias:
+        destino = crear_tabla_nueva(cursor, table_name)
+    else:
+        destino = f"{table_name}_nueva"
+        crear_tabla(cursor, destino, spec)
+
+    # La cuarentena guarda solo los rechazos de la última carga
+    cursor.execute("DELETE FROM ingesta_cuarentena WHERE dataset = %s;", (table_name,))
+
+    filas_cargadas = 0
+    filas_rechazadas = 0
+    for data, cuarentena in lotes:
+        filas_cargadas += copiar_filas(
+            cursor, destino, columnas, data.itertuples(index=False, name=None)
+        )
+        filas_rechazadas += poner_en_cuarentena(cursor, table_name, cuarentena)
+
+    # Antes de aplicar las diferencias o intercambiar la tabla, que bloquean la actual
+    if sin_cambios and sin_cambios():
+        return None
+
+    barrio = spec.get("barrio")
+    if barrio and "geometria" in barrio:
+        asignar_barrio_espacial(cursor, destino, barrio["geometria"])
+
+    if diferencias:
+        _asegurar_indice_clave(cursor, table_name, spec)
+        cambiadas, borradas = aplicar_diferencias(cursor, table_name, destino, columnas, clave)
+        print(f"Tabla '{table_name}': {cambiadas} filas insertadas o actualizadas, {borradas} borradas.")
+        crear_indices(cursor, table_name, spec)
+        cursor.execute(f"ANALYZE {table_name};")
+    elif filas_cargadas == 0 and existe:
+        # Un origen vacío suele ser un error de descarga: no se sustituye la tabla
+        print(f"Tabla '{table_name}': el origen no tiene filas, se conservan los datos actuales.")
+        cursor.execute(f"DROP TABLE {destino};")
+        crear_indices(cursor, table_name, spec)
+    else:
+        # Los índices se crean después de la carga, que así es más rápida
+        crear_indices(cursor, destino, spec)
+        cursor.execute(f"ANALYZE {destino};")
+        intercambiar_tabla(cursor, table_name, destino)
+
+    verificar_indices(cursor, table_name, spec)
+
+    return filas_cargadas, filas_rechazadas
+
+
+def ejecutar_dataset(nombre, db_config=CONFIG_DB, forzar=False):
+    """
+    Ejecuta las etapas de lectura, transformación y carga de un dataset del registro.
+
+    Si el origen no ha cambiado desde la última carga (respuesta 304 o mismo
+    sha256) y la tabla existe, la carga se omite; si los barrios sí han
+    cambiado, solo se vuelve a asignar el barrio_id por geometría.
+
+    Args:
+        nombre (str): Nombre del dataset en DATASETS (también es la tabla destino).
+        db_config (dict): Configuración de la conexión a PostgreSQL.
+        forzar (bool): Carga el dataset aunque el origen no haya cambiado.
+
+    Returns:
+        bool: True si la carga termina correctamente o no es necesaria.
+    """
+    spec = DATASETS[nombre]
+    conn = None
+    cursor = None
+    flujo = None
+    try:
+        inicio = perf_counter()
+
+        # Conectar a PostgreSQL
+        conn = pg8000.connect(**db_config)
+        cursor = conn.cursor()
+
+        # Asegurar que la extensión PostGIS está habilitada
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+
+        # Sin tabla (o con otro esquema) se carga siempre, aunque haya huella
+        huella_anterior = leer_huella(cursor, nombre)
+        if forzar or _columnas_tabla(cursor, nombre) != list(spec["esquema"]):
+            huella_anterior = None
+
+        # Si los barrios han cambiado desde la última carga, el barrio_id asignado
+        # por geometría hay que recalcularlo aunque el origen no haya cambiado
+        entradas = _entradas_barrio(cursor, spec)
+        reasignar = entradas is not None and leer_entradas(cursor, nombre) != entradas
+
+        flujo, huella = obtener_origen(spec, huella_anterior)
+        if huella is None:
+            return False
+        if flujo is None:
+            guardar_huella(cursor, nombre, huella)
+            if reasignar:
+                reasignar_barrio_espacial(cursor, nombre, spec, entradas)
+            conn.commit()
+            print(f"Tabla '{nombre}': el origen no ha cambiado, no se recarga.")
+            return True
+
+        lotes = _preparar_lotes(cursor, flujo, nombre, spec)
+        # En las URLs el sha256 solo se conoce al terminar de leer el origen: si coincide
+        # con el de la carga anterior se deshace lo copiado sin tocar la tabla actual
+        resultado = cargar(
+            cursor, lotes, nombre, spec,
+            sin_cambios=lambda: bool(huella_anterior) and huella["sha256"] == huella_anterior["sha256"]
+        )
+        if resultado is None:
+            conn.rollback()
+            guardar_huella(cursor, nombre, huella)
+            if reasignar:
+                reasignar_barrio_espacial(cursor, nombre, spec, entradas)
+            conn.commit()
+            print(f"Tabla '{nombre}': el origen no ha cambiado, no se recarga.")
+            return True
+        filas_cargadas, filas_rechazadas = resultado
+
+        guardar_huella(cursor, nombre, huella)
+        incrementar_version(cursor, nombre, entradas)
+
+        # Confirmar transacciones
+        conn.commit()
+        print(f"Datos cargados en la tabla '{nombre}' correctamente.")
+        informe_carga(nombre, filas_cargadas, filas_rechazadas, inicio)
+        return True
+
+    except Exception as e:
+        print(f"Error al cargar los datos en PostgreSQL: {e}")
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        # Cerrar el origen, el cursor y la conexión de forma segura
+        if flujo:
+            flujo.close()
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+# Ejecutar los datasets indicados o, si no se indica ninguno, todos.
+# Con --forzar se recargan aunque el origen no haya cambiado.
+if __name__ == "__main__":
+    forzar = "--forzar" in sys.argv[1:]
+    nombres = [argumento for argumento in sys.argv[1:] if argumento != "--forzar"] or list(DATASETS)
+    resultados = [ejecutar_dataset(nombre, forzar=forzar) for nombre in nombres]
+    sys.exit(0 if all(resultados) else 1)
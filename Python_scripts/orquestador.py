@@ -0,0 +1,245 @@
+import argparse
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import perf_counter, sleep
+
+import pg8000
+
+from datasets import DATASETS
+from derivadas import DERIVADAS, construir_derivada
+from ingesta import CONFIG_DB, crear_tablas_metadatos, ejecutar_dataset
+from scriptdemanda import create_demanda_table
+
+
+def construir_pasos(forzar=False):
+    """
+    Devuelve los pasos de la ingesta: nombre -> (función, argumentos, pasos de los que depende).
+
+    Cada dataset y cada tabla derivada del registro es un paso; su campo
+    "depende_de" indica qué pasos tienen que haber terminado correctamente
+    antes de lanzarlo.
+    """
+    pasos = {
+        nombre: (ejecutar_dataset, (nombre, CONFIG_DB, forzar), spec.get("depende_de", ()))
+        for nombre, spec in DATASETS.items()
+    }
+    pasos.update({
+        nombre: (construir_derivada, (nombre, CONFIG_DB, forzar), spec["depende_de"])
+        for nombre, spec in DERIVADAS.items()
+    })
+    pasos["demanda"] = (create_demanda_table, (), ())
+    return pasos
+
+
+def esperar_postgres(db_config=CONFIG_DB, timeout=120, intervalo=1):
+    """
+    Espera hasta que PostgreSQL acepta conexiones y PostGIS está disponible.
+
+    Returns:
+        bool: True si la base de datos está lista antes del timeout.
+    """
+    limite = perf_counter() + timeout
+    while True:
+        try:
+            conn = pg8000.connect(**db_config)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+                cursor.execute("SELECT PostGIS_Version();")
+                version = cursor.fetchone()[0]
+                conn.commit()
+            finally:
+                conn.close()
+            print(f"PostgreSQL listo (PostGIS {version}).")
+            return True
+        except Exception as e:
+            if perf_counter() >= limite:
+                print(f"PostgreSQL no está disponible tras {timeout}s: {e}")
+                return False
+            sleep(intervalo)
+
+
+def _cronometrar(funcion, *args):
+    """
+    Ejecuta un paso en el proceso hijo y mide su duración.
+
+    Returns:
+        tuple: (True si el paso termina correctamente, segundos)
+    """
+    inicio = perf_counter()
+    resultado = funcion(*args)
+    return resultado is not False, perf_counter() - inicio
+
+
+def _migrar_metadatos(cursor):
+    """
+    Añade a las tablas de metadatos de bases de datos anteriores las columnas
+    nuevas. Solo se ejecuta el ALTER si falta la columna: bloquea la tabla
+    entera, y los pasos y la aplicación la leen continuamente.
+    """
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'ingesta_versiones' AND column_name = 'entradas';
+    """)
+    if cursor.fetchone() is None:
+        cursor.execute("ALTER TABLE ingesta_versiones ADD COLUMN entradas JSONB;")
+
+
+def _registrar_inicio(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingesta_ejecuciones (
+            id SERIAL PRIMARY KEY,
+            inicio TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fin TIMESTAMP,
+            correcta BOOLEAN
+        );
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingesta_pasos (
+            id_ejecucion INTEGER REFERENCES ingesta_ejecuciones (id),
+            paso TEXT,
+            estado TEXT,
+            segundos FLOAT,
+            PRIMARY KEY (id_ejecucion, paso)
+        );
+    """)
+    # Tablas compartidas por los pasos, creadas antes de lanzarlos en paralelo
+    crear_tablas_metadatos(cursor)
+    _migrar_metadatos(cursor)
+    cursor.execute("INSERT INTO ingesta_ejecuciones DEFAULT VALUES RETURNING id;")
+    return cursor.fetchone()[0]
+
+
+def ejecutar_pasos(pasos, procesos=None):
+    """
+    Ejecuta los pasos en paralelo respetando sus dependencias.
+
+    Un paso se lanza en cuanto todas sus dependencias han terminado
+    correctamente; si alguna falla, el paso se marca como omitido.
+
+    Returns:
+        dict: paso -> (estado, segundos), con estado "ok", "error" u "omitido".
+    """
+    pendientes = dict(pasos)
+    resultados = {}
+    en_curso = {}
+
+    with ProcessPoolExecutor(max_workers=procesos or min(len(pasos), os.cpu_count() or 4)) as pool:
+        while pendientes or en_curso:
+            for nombre, (funcion, args, dependencias) in list(pendientes.items()):
+                estados = [resultados.get(dependencia, (None,))[0] for dependencia in dependencias]
+                if any(estado in ("error", "omitido") for estado in estados):
+                    print(f"Paso '{nombre}' omitido: falló una dependencia ({', '.join(dependencias)}).")
+                    resultados[nombre] = ("omitido", 0.0)
+                    del pendientes[nombre]
+                elif all(estado == "ok" for estado in estados):
+                    print(f"Lanzando paso '{nombre}'...")
+                    en_curso[pool.submit(_cronometrar, funcion, *args)] = nombre
+                    del pendientes[nombre]
+
+            if not en_curso:
+                # Quedan pasos cuyas dependencias no existen o forman un ciclo
+                for nombre in pendientes:
+                    print(f"Paso '{nombre}' omitido: dependencias no resolubles.")
+                    resultados[nombre] = ("omitido", 0.0)
+                break
+
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = en_curso.pop(futuro)
+                try:
+                    correcto, segundos = futuro.result()
+                except Exception as e:
+                    print(f"Error en el paso '{nombre}': {e}")
+                    correcto, segundos = False, 0.0
+                resultados[nombre] = ("ok" if correcto else "error", segundos)
+                print(f"Paso '{nombre}' terminado ({resultados[nombre][0]}) en {segundos:.2f}s")
+
+    return resultados
+
+
+def orquestar(db_config=CONFIG_DB, procesos=None, forzar=False):
+    """
+    Espera a la base de datos, ejecuta todos los pasos y deja registrada la
+    ejecución en 'ingesta_ejecuciones', que es lo que espera la aplicación.
+
+    Returns:
+        bool: True si todos los pasos terminan correctamente.
+    """
+    if not esperar_postgres(db_config):
+        return False
+
+    conn = pg8000.connect(**db_config)
+    try:
+        cursor = conn.cursor()
+        id_ejecucion = _registrar_inicio(cursor)
+        conn.commit()
+
+        inicio = perf_counter()
+        resultados = ejecutar_pasos(construir_pasos(forzar), procesos=procesos)
+        correcta = all(estado == "ok" for estado, _ in resultados.values())
+
+        for paso, (estado, segundos) in resultados.items():
+            cursor.execute(
+                "INSERT INTO ingesta_pasos (id_ejecucion, paso, estado, segundos) VALUES (%s, %s, %s, %s);",
+                (id_ejecucion, paso, estado, segundos)
+            )
+        cursor.execute(
+            "UPDATE ingesta_ejecuciones SET fin = CURRENT_TIMESTAMP, correcta = %s WHERE id = %s;",
+            (correcta, id_ejecucion)
+        )
+        conn.commit()
+        print(f"Ingesta {'completada' if correcta else 'completada con errores'} en {perf_counter() - inicio:.2f}s")
+        return correcta
+    finally:
+        conn.close()
+
+
+def esperar_ingesta(db_config=CONFIG_DB, timeout=600, intervalo=2):
+    """
+    Espera a que exista una ejecución de la ingesta terminada.
+
+    Returns:
+        bool: True si la ingesta ha terminado antes del timeout.
+    """
+    if not esperar_postgres(db_config, timeout=timeout):
+        return False
+
+    limite = perf_counter() + timeout
+    while perf_counter() < limite:
+        conn = pg8000.connect(**db_config)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT to_regclass('ingesta_ejecuciones');")
+            if cursor.fetchone()[0] is not None:
+                cursor.execute("""
+                    SELECT fin, correcta FROM ingesta_ejecuciones
+                    ORDER BY id DESC LIMIT 1;
+                """)
+                ultima = cursor.fetchone()
+                if ultima and ultima[0] is not None:
+                    if not ultima[1]:
+                        print("La última ingesta terminó con errores; se usan los datos disponibles.")
+                    return True
+        finally:
+            conn.close()
+        sleep(intervalo)
+
+    print(f"La ingesta no ha terminado tras {timeout}s.")
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Orquestador de la ingesta de datos en PostgreSQL.")
+    parser.add_argument("--esperar", action="store_true",
+                        help="No ejecuta la ingesta: espera a que termine la ejecución en curso.")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Número máximo de procesos en paralelo.")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Recarga los datasets aunque su origen no haya cambiado.")
+    args = parser.parse_args()
+
+    if args.esperar:
+        sys.exit(0 if esperar_ingesta() else 1)
+    sys.exit(0 if orquestar(procesos=args.procesos, forzar=args.forzar) else 1)
@@ -3,12 +3,26 @@ import pandas as pd
 import geopandas as gpd
 from streamlit_folium import st_folium
 import folium
+from folium.plugins import FastMarkerCluster
+import copy
+import json
+import math
 from sqlalchemy import create_engine, text
-import unicodedata
 import numpy as np
 from contextlib import contextmanager
+from collections import OrderedDict
+import threading
+import queue
+import atexit
+from datetime import datetime
+from time import monotonic, sleep
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from branca.element import Template, MacroElement
 
+from datasets import CODIGOS_REGIMEN
+from derivadas import ZOOMS_SIMPLIFICADOS
+
 # Enhanced Database Configuration
 DB_CONFIG = {
     "host": "postgres",
@@ -41,101 +55,393 @@ def get_connection():
     finally:
         connection.close()
 
-def normalize_text(text):
-    if isinstance(text, str):
-        return unicodedata.normalize('NFKD', text.lower()).encode('ASCII', 'ignore').decode('ASCII')
-    return text
+# regimen_code of centros_educativos, assigned at ingest
+SCHOOL_CODES = CODIGOS_REGIMEN
+REGIMEN_CODE_DTYPE = pd.CategoricalDtype(sorted(SCHOOL_CODES.values()))
+
+def school_codes(school_types):
+    """Sorted tuple of the regimen codes of the selected school types."""
+    return tuple(sorted({SCHOOL_CODES[t] for t in school_types if t in SCHOOL_CODES}))
 
-def fetch_data(table_name):
+def school_types_of(regimen_codes):
+    """School types of a tuple of regimen codes; None stays None (no school filter)."""
+    if regimen_codes is None:
+        return None
+    return [t for t, code in SCHOOL_CODES.items() if code in regimen_codes]
+
+def fetch_data_versions():
+    """
+    Returns table -> data generation, bumped by the loaders in ingesta_versiones
+    every time they load a table. One small query per rerun.
+    """
     try:
-        # Get column information
         with get_connection() as conn:
-            columns_query = text(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table_name}'")
-            result = conn.execute(columns_query)
-            columns = result.fetchall()
-
-        # Price data handling
-        if table_name == 'precios_barrios':
-            with get_connection() as conn:
-                query = text(f"SELECT * FROM {table_name};")
-                price_data = pd.read_sql(query, conn)
-            return price_data
-
-        # Geometry columns handling
-        geo_columns = [col[0] for col in columns if 'geo' in col[0].lower() or 'shape' in col[0].lower() or 'point' in col[0].lower()]
-        if not geo_columns:
-            st.error(f"No geometry column found in table {table_name}")
-            return None
-
-        geo_col = geo_columns[0]
-        query = text(f"SELECT *, {geo_col} AS geometry FROM {table_name} LIMIT 500;")
+            rows = conn.execute(text("SELECT tabla, version FROM ingesta_versiones;")).fetchall()
+        return {tabla: version for tabla, version in rows}
+    except Exception as e:
+        st.error(f"Error fetching data versions: {e}")
+        return {}
 
+# Rows per page when streaming a layer from a server-side cursor
+FEATURE_PAGE_SIZE = 5000
+
+def fetch_layer_columns(table_names):
+    """
+    Returns table -> (columns, geometry column) for several tables with one catalog
+    query. Columns are in table order; the geometry column comes from PostGIS
+    geometry_columns and is None if the table has none.
+    """
+    with get_connection() as conn:
+        rows = conn.execute(text("""
+            SELECT c.table_name, c.column_name, g.f_geometry_column IS NOT NULL
+            FROM information_schema.columns c
+            LEFT JOIN geometry_columns g
+              ON g.f_table_name = c.table_name AND g.f_geometry_column = c.column_name
+            WHERE c.table_name = ANY(:table_names)
+            ORDER BY c.table_name, c.ordinal_position;
+        """), {"table_names": list(table_names)}).fetchall()
+    layers = {}
+    for table_name in table_names:
+        table_rows = [(column, is_geometry) for table, column, is_geometry in rows if table == table_name]
+        geo_columns = [column for column, is_geometry in table_rows if is_geometry]
+        layers[table_name] = ([column for column, _ in table_rows], geo_columns[0] if geo_columns else None)
+    return layers
+
+def layer_columns(table_name):
+    return fetch_layer_columns([table_name])[table_name]
+
+# The columns only change with a load, so the catalog is read once per data generation
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_layer_catalog(table_names, versions):
+    return fetch_layer_columns(table_names)
+
+def iter_features(table_name, bbox=None, barrio_ids=None, page_size=FEATURE_PAGE_SIZE, layer=None):
+    """
+    Streams the features of a layer as GeoDataFrames (EPSG:4326) of at most
+    page_size rows, read from a server-side cursor so that only one page of rows
+    is held by the driver at a time. Always yields at least one, maybe empty, page.
+
+    bbox (min_lon, min_lat, max_lon, max_lat) keeps the features intersecting it,
+    through the GiST index of the geometry column; barrio_ids keeps the features
+    of those barrios, through the barrio_id index. layer is the
+    (columns, geometry column) pair of the table, if already known.
+    """
+    columns, geo_col = layer or layer_columns(table_name)
+    if geo_col is None:
+        raise ValueError(f"No geometry column found in table {table_name}")
+
+    conditions = [f'"{geo_col}" IS NOT NULL']
+    params = {}
+    if bbox is not None:
+        conditions.append(f'ST_Intersects("{geo_col}", ST_MakeEnvelope(:xmin, :ymin, :xmax, :ymax, 4326))')
+        params.update(zip(("xmin", "ymin", "xmax", "ymax"), map(float, bbox)))
+    if barrio_ids is not None:
+        conditions.append("barrio_id = ANY(:barrio_ids)")
+        params["barrio_ids"] = [int(barrio_id) for barrio_id in barrio_ids]
+
+    attributes = [f'"{column}"' for column in columns if column != geo_col]
+    query = text(f"""
+        SELECT {', '.join(attributes + [f'ST_AsBinary("{geo_col}") AS geometry'])}
+        FROM {table_name}
+        WHERE {' AND '.join(conditions)};
+    """)
+
+    with get_connection() as conn:
+        result = conn.execution_options(yield_per=page_size).execute(query, params)
+        names = list(result.keys())
+        empty = True
+        for rows in result.partitions():
+            empty = False
+            yield features_page(rows, names)
+        if empty:
+            yield features_page([], names)
+
+def features_page(rows, names):
+    page = pd.DataFrame(rows, columns=names)
+    geometry = gpd.GeoSeries.from_wkb(page.pop('geometry'), index=page.index, crs="EPSG:4326")
+    return gpd.GeoDataFrame(page, geometry=geometry)
+
+def fetch_features(table_name, bbox=None, barrio_ids=None, layer=None):
+    """
+    Returns the features of a layer in one GeoDataFrame, with the same filters
+    as iter_features and no row limit.
+    """
+    pages = list(iter_features(table_name, bbox=bbox, barrio_ids=barrio_ids, layer=layer))
+    return pages[0] if len(pages) == 1 else pd.concat(pages, ignore_index=True)
+
+# Shared by all sessions and reruns; keyed by table and data generation, so a new
+# load is picked up on the next rerun and the old generation is eventually evicted.
+# The returned frames are shared: filter them into new frames, never modify them in place.
+# _layer, the column metadata, is not part of the key.
+@st.cache_resource(max_entries=10, show_spinner=False)
+def load_table(table_name, version, _layer=None):
+    # Price data handling
+    if table_name == 'precios_barrios':
         with get_connection() as conn:
-            data = gpd.read_postgis(query, conn, geom_col='geometry')
+            query = text(f"SELECT * FROM {table_name};")
+            price_data = pd.read_sql(query, conn)
+        return price_data
+
+    # Complete layer, streamed page by page
+    data = fetch_features(table_name, layer=_layer)
+
+    # Held as a categorical: filtering by school type is an integer mask
+    if 'regimen_code' in data.columns:
+        data['regimen_code'] = data['regimen_code'].astype(REGIMEN_CODE_DTYPE)
+
+    return data[data.geometry.is_valid]
 
-        if 'regimen' in data.columns:
-            data['regimen_normalized'] = data['regimen'].apply(normalize_text)
+# Tables loaded at step 2; the barrio polygons come from barrio_features
+LAYER_TABLES = ('paradas_metro', 'centros_educativos', 'precios_barrios', 'zonas_infantiles')
 
-        data = data[data.geometry.notnull()]
-        data = data[data.geometry.is_valid]
+def load_layer(table_name, versions, layer=None):
+    return load_table(table_name, versions.get(table_name, 0), _layer=layer)
 
-        return data
+def fetch_layers(table_names, versions=None):
+    """
+    Returns table -> data for several tables from the process-wide cache (None for
+    a table that failed to load; errors are not cached, the next rerun retries).
 
+    Tables whose data generation has changed are loaded concurrently, each on its
+    own pooled connection, after one catalog query for the columns of all the
+    tables, so the wait is that of the slowest table rather than the sum.
+    """
+    if versions is None:
+        versions = fetch_data_versions()
+    try:
+        catalog = load_layer_catalog(
+            tuple(table_names), tuple(versions.get(table_name, 0) for table_name in table_names)
+        )
     except Exception as e:
-        st.error(f"Error fetching data from {table_name}: {e}")
+        st.error(f"Error fetching table columns: {e}")
+        return {table_name: None for table_name in table_names}
+
+    # The workers share this run's context, so the cached functions can run in them
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=len(table_names),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    ) as pool:
+        futures = {
+            table_name: pool.submit(load_layer, table_name, versions, catalog[table_name])
+            for table_name in table_names
+        }
+
+    layers = {}
+    for table_name, future in futures.items():
+        try:
+            layers[table_name] = future.result()
+        except Exception as e:
+            st.error(f"Error fetching data from {table_name}: {e}")
+            layers[table_name] = None
+    return layers
+
+def fetch_data(table_name, versions=None):
+    """
+    Returns the table from the process-wide cache, loading it only when its data
+    generation has changed. Errors are not cached, the next rerun retries.
+    """
+    return fetch_layers((table_name,), versions)[table_name]
+
+# Zoom levels with a simplified barrio polygon in barrio_features
+SIMPLIFIED_ZOOMS = ZOOMS_SIMPLIFICADOS
+BARRIO_SHAPE_COLUMNS = ['geojson'] + [f'geojson_z{zoom}' for zoom in SIMPLIFIED_ZOOMS]
+
+def barrio_shape_column(zoom):
+    """
+    GeoJSON column of fetch_barrio_features used to draw the barrios at the given
+    zoom: the first simplified level that covers it, or the full polygon beyond them.
+    """
+    for level in SIMPLIFIED_ZOOMS:
+        if zoom <= level:
+            return f'geojson_z{level}'
+    return 'geojson'
+
+def build_barrio_filter_query(min_security, price_category, require_metro, school_types):
+    """
+    Turns the sidebar selections into one parameterized statement returning the
+    ids of the matching barrios. Security and price come from barrio_features;
+    metro stops and schools are checked with EXISTS on the barrio_id index of
+    each point layer (assigned at load time by a spatial join), so the cost per
+    barrio does not grow with the size of the layers.
+
+    price_category 0 means any category; school_types None means no school filter,
+    otherwise the barrio needs at least one school of the selected types.
+    Transaction type and playgrounds do not restrict the barrios: there is a
+    single price per barrio, and playgrounds are only drawn on the map.
+
+    Returns:
+        tuple: (sqlalchemy text query, params)
+    """
+    conditions = ["f.criminalidad >= :min_security"]
+    params = {"min_security": int(min_security)}
+    if price_category:
+        conditions.append("f.categoria_precio = :price_category")
+        params["price_category"] = int(price_category)
+    if require_metro:
+        conditions.append("EXISTS (SELECT 1 FROM paradas_metro p WHERE p.barrio_id = f.barrio_id)")
+    if school_types is not None:
+        if school_types:
+            conditions.append(f"""EXISTS (
+                SELECT 1 FROM centros_educativos c
+                WHERE c.barrio_id = f.barrio_id AND c.regimen_code = ANY(:school_codes)
+            )""")
+            params["school_codes"] = list(school_codes(school_types))
+        else:
+            conditions.append("FALSE")
+
+    query = text(f"""
+        SELECT f.barrio_id
+        FROM barrio_features f
+        WHERE {' AND '.join(conditions)}
+        ORDER BY f.barrio_id;
+    """)
+    return query, params
+
+# Tables read by build_barrio_filter_query: its result is valid for their data generation
+FILTER_TABLES = ('barrio_features', 'paradas_metro', 'centros_educativos')
+
+def fetch_filtered_barrio_ids(min_security, price_category, require_metro, school_types):
+    """
+    Runs build_barrio_filter_query; only the matching ids cross the wire.
+    Returns None on error.
+    """
+    query, params = build_barrio_filter_query(min_security, price_category, require_metro, school_types)
+    try:
+        with get_connection() as conn:
+            return [barrio_id for (barrio_id,) in conn.execute(query, params)]
+    except Exception as e:
+        st.error(f"Error fetching filtered barrios: {e}")
         return None
 
+# Shared like load_table, keyed by the data generation of barrio_features
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_barrio_features(version):
+    query = text(f"""
+        SELECT barrio_id, nombre, criminalidad, categoria_precio, paradas_metro,
+               centros_publicos, centros_concertados, centros_privados,
+               zonas_infantiles, area_m2, geo_shape AS geometry,
+               ST_AsGeoJSON(geo_shape, 6) AS geojson,
+               {', '.join(f'ST_AsGeoJSON(geo_shape_z{zoom}, 6) AS geojson_z{zoom}' for zoom in SIMPLIFIED_ZOOMS)}
+        FROM barrio_features
+        ORDER BY barrio_id;
+    """)
+    with get_connection() as conn:
+        return gpd.read_postgis(query, conn, geom_col='geometry')
+
+def fetch_barrio_features(versions=None):
+    """
+    Returns barrio_features, one row per barrio with its polygon at every level
+    of detail, from the process-wide cache.
+    """
+    if versions is None:
+        versions = fetch_data_versions()
+    try:
+        return load_barrio_features(versions.get('barrio_features', 0))
+    except Exception as e:
+        st.error(f"Error fetching data from barrio_features: {e}")
+        return None
+
+def points_in_barrios(points_data, barrios_data):
+    """
+    Keeps the points whose barrio_id (assigned at load time by a spatial join)
+    is one of the given barrios.
+    """
+    return points_data[points_data['barrio_id'].isin(barrios_data['barrio_id'])]
+
 def filter_metro_within_barrios(metro_data, barrios_data):
     try:
-        combined_barrios_geometry = barrios_data.unary_union
-        metro_data = metro_data[metro_data.geometry.notnull()]
-        metro_data = metro_data[metro_data.geometry.is_valid]
-        metro_data_filtered = metro_data[metro_data.geometry.within(combined_barrios_geometry)]
-        return metro_data_filtered
+        return points_in_barrios(metro_data[metro_data.geometry.notnull()], barrios_data)
     except Exception as e:
         st.error(f"Error filtering metro stations within barrios: {e}")
         return metro_data
 
 def filter_centers_within_barrios(centers_data, barrios_data, metro_data=None, filter_metro_stations_only=False):
     try:
-        combined_barrios_geometry = barrios_data.unary_union
         centers_data = centers_data[centers_data.geometry.notnull()]
-        centers_data = centers_data[centers_data.geometry.is_valid]
-
-        centers_in_barrios = centers_data[centers_data.geometry.within(combined_barrios_geometry)]
 
         if filter_metro_stations_only and metro_data is not None:
-            barrios_with_metro = barrios_data[barrios_data.geometry.intersects(metro_data.geometry.unary_union)]
-            centers_filtered = centers_in_barrios[
-                centers_in_barrios.geometry.within(barrios_with_metro.unary_union)
-            ]
-            return centers_filtered
+            barrios_data = barrios_data[barrios_data['barrio_id'].isin(metro_data['barrio_id'])]
 
-        return centers_in_barrios
+        return points_in_barrios(centers_data, barrios_data)
     except Exception as e:
         st.error(f"Error filtering educational centers: {e}")
         return centers_data
 
 def filter_zonas_infantiles_within_barrios(zonas_data, barrios_data):
     try:
-        combined_barrios_geometry = barrios_data.unary_union
-        zonas_data = zonas_data[zonas_data.geometry.notnull()]
-        zonas_data = zonas_data[zonas_data.geometry.is_valid]
-
-        zonas_in_barrios = zonas_data[zonas_data.geometry.within(combined_barrios_geometry)]
-        return zonas_in_barrios
+        return points_in_barrios(zonas_data[zonas_data.geometry.notnull()], barrios_data)
     except Exception as e:
         st.error(f"Error filtering zonas infantiles: {e}")
         return zonas_data
     
-def create_map(metro_data, barrios_data, centros_data, zonas_infantiles_data, filter_metro_stations_only, filtered_barrios_data, show_metro_stations, selected_school_types, show_zonas_infantiles):
+# Point layers with more features than this are clustered in the browser
+CLUSTER_THRESHOLD = 500
+
+# Builds each clustered marker from a [lat, lon, color, popup] row
+CLUSTER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 5, color: row[2], fill: true, fillColor: row[2], fillOpacity: 0.8
+    });
+    marker.bindPopup(row[3]);
+    return marker;
+};
+"""
+
+def column_or_default(data, column, default):
+    """Values of the column as strings, or the default for every row if it is missing."""
+    if column in data.columns:
+        return data[column].fillna(default).astype(str)
+    return pd.Series(default, index=data.index, dtype=object)
+
+def add_points_layer(m, points, color, popup):
+    """
+    Adds a point layer to the map as a single Leaflet object: one GeoJSON
+    FeatureCollection styled from each feature's properties or, above
+    CLUSTER_THRESHOLD points, a client-side marker cluster.
+
+    color and popup are a value or a Series aligned with points.
+    """
+    points = points[points.geometry.notnull() & ~points.geometry.is_empty]
+    if points.empty:
+        return
+    colors = color if isinstance(color, pd.Series) else pd.Series(color, index=points.index)
+    rows = zip(points.geometry.y, points.geometry.x, colors.loc[points.index], popup.loc[points.index])
+
+    if len(points) > CLUSTER_THRESHOLD:
+        FastMarkerCluster(data=[list(row) for row in rows], callback=CLUSTER_CALLBACK).add_to(m)
+        return
+
+    folium.GeoJson(
+        {
+            "type": "FeatureCollection",
+            "features": [
+                {
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"color": point_color, "popup": point_popup},
+                }
+                for lat, lon, point_color, point_popup in rows
+            ],
+        },
+        marker=folium.CircleMarker(radius=5, fill=True, fill_opacity=0.8),
+        style_function=lambda feature: {
+            'color': feature['properties']['color'],
+            'fillColor': feature['properties']['color'],
+        },
+        popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+    ).add_to(m)
+
+def create_map(metro_data, barrios_data, centros_data, zonas_infantiles_data, filter_metro_stations_only, filtered_barrios_data, show_metro_stations, selected_school_types, show_zonas_infantiles, zoom=12):
     m = folium.Map(location=[39.4699, -0.3763], zoom_start=12)
     metro_color = 'red'
     selected_color = 'green'
     school_colors = {'publico': 'purple', 'concertado': 'orange', 'privado': 'blue'}
     zonas_color= 'yellow'
 
-    normalized_selected_types = [normalize_text(st) for st in selected_school_types]
+    selected_codes = school_codes(selected_school_types)
+    code_colors = {SCHOOL_CODES[t]: color for t, color in school_colors.items()}
 
     legend_template = """
     {% macro html(this, kwargs) %}
@@ -221,65 +527,41 @@ def create_map(metro_data, barrios_data, centros_data, zonas_infantiles_data, fi
     m.get_root().add_child(macro)
 
     if show_metro_stations:
-        filtered_metro = metro_data[
-            metro_data.geometry.apply(
-                lambda point: any(point.within(barrio_geom) for barrio_geom in filtered_barrios_data.geometry)
-            )
-        ]
-        
-        filtered_metro = filtered_metro[filtered_metro.geometry.notnull()]
-        for _, row in filtered_metro.iterrows():
-            point = row.geometry
-            if point.is_empty:
-                continue
-            folium.CircleMarker(
-                location=[point.y, point.x],
-                radius=5,
-                popup=row.get("name", "Parada de Metro"),
-                color=metro_color,
-                fill=True,
-                fillColor=metro_color
-            ).add_to(m)
+        filtered_metro = points_in_barrios(metro_data, filtered_barrios_data)
+        add_points_layer(m, filtered_metro, metro_color, column_or_default(filtered_metro, "name", "Parada de Metro"))
 
     if len(centros_data) > 0:
-        centros_data = centros_data[centros_data.geometry.notnull()]
-        for _, row in centros_data.iterrows():
-            if row['regimen_normalized'] in normalized_selected_types:
-                point = row.geometry
-                if point.is_empty:
-                    continue
-                folium.CircleMarker(
-                    location=[point.y, point.x],
-                    radius=5,
-                    popup=f"{row.get('nombre', 'Centro Educativo')} ({row['regimen']})",
-                    color=school_colors.get(row['regimen_normalized'], 'gray'),
-                    fill=True,
-                    fillColor=school_colors.get(row['regimen_normalized'], 'gray')
-                ).add_to(m)
+        centros_data = centros_data[centros_data['regimen_code'].isin(selected_codes)]
+        add_points_layer(
+            m,
+            centros_data,
+            centros_data['regimen_code'].map(code_colors).astype(object).fillna('gray'),
+            column_or_default(centros_data, 'nombre', 'Centro Educativo') + " (" + centros_data['regimen'].astype(str) + ")"
+        )
 
     if show_zonas_infantiles and zonas_infantiles_data is not None and not zonas_infantiles_data.empty:
-        for _, row in zonas_infantiles_data.iterrows():
-            point = row.geometry
-            if point.is_empty:
-                continue
-            folium.CircleMarker(
-                location=[point.y, point.x],
-                radius=5,
-                popup=row.get("jardin", "Zona Infantil"),
-                color=zonas_color,
-                fill=True,
-                fillColor=zonas_color
-            ).add_to(m)
-
-    filtered_barrios_data = filtered_barrios_data[filtered_barrios_data.geometry.notnull()]
-    for _, row in filtered_barrios_data.iterrows():
-        geometry = row.geometry
-        if geometry.is_empty:
-            continue
+        add_points_layer(m, zonas_infantiles_data, zonas_color, column_or_default(zonas_infantiles_data, "jardin", "Zona Infantil"))
+
+    # All barrios in one layer, with the polygons simplified for the current zoom
+    # already serialized by PostGIS
+    shape_column = barrio_shape_column(zoom)
+    barrio_shapes = [
+        {
+            "type": "Feature",
+            "geometry": json.loads(shape),
+            "properties": {"nombre": nombre},
+        }
+        for shape, nombre in zip(
+            filtered_barrios_data.get(shape_column, pd.Series(dtype=object)),
+            column_or_default(filtered_barrios_data, "nombre", "Barrio sin nombre")
+        )
+        if shape
+    ]
+    if barrio_shapes:
         folium.GeoJson(
-            geometry.__geo_interface__,
-            popup=row.get("nombre", "Barrio sin nombre"),
-            tooltip=row.get("nombre", "Barrio sin nombre"),
+            {"type": "FeatureCollection", "features": barrio_shapes},
+            popup=folium.GeoJsonPopup(fields=["nombre"], labels=False),
+            tooltip=folium.GeoJsonTooltip(fields=["nombre"], labels=False),
             style_function=lambda _: {
                 'fillColor': selected_color,
                 'fillOpacity': 0.5,
@@ -290,27 +572,270 @@ def create_map(metro_data, barrios_data, centros_data, zonas_infantiles_data, fi
 
     return m
 
-def save_demanda(barrios, email, nombre, apellidos, transaction_type):
+# Approximate rendered size, in characters, of all the maps kept in the shared map cache
+MAP_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+# Approximate rendered characters of one point marker, for estimate_map_size
+MAP_POINT_SIZE = 200
+
+# Tables whose data generation is part of the map cache key
+MAP_TABLES = ('barrio_features', 'paradas_metro', 'centros_educativos', 'zonas_infantiles')
+
+# Point layers drawn on the map, read for the map view only
+MAP_POINT_TABLES = ('paradas_metro', 'centros_educativos', 'zonas_infantiles')
+
+# The map view is widened to this grid, in degrees, before querying the points, so
+# small pans keep the same view (and map cache key) and the points just outside it
+# are already drawn
+VIEW_GRID = 0.05
+
+def snap_view(bounds):
     """
-    Guarda los datos de la demanda en la tabla 'demanda' en la base de datos.
+    Turns the bounds returned by st_folium into a (min_lon, min_lat, max_lon,
+    max_lat) tuple widened to VIEW_GRID, or None if there are no bounds.
     """
     try:
-        with get_connection() as conn:
-            for barrio in barrios:
-                query = text("""
-                    INSERT INTO demanda (barrio, email, nombre, apellidos, tipo_transaccion, timestamp)
-                    VALUES (:barrio, :email, :nombre, :apellidos, :tipo_transaccion, NOW())
-                """)
-                conn.execute(query, {
-                    "barrio": barrio,
-                    "email": email,
-                    "nombre": nombre,
-                    "apellidos": apellidos,
-                    "tipo_transaccion": transaction_type
-                })
-            conn.commit()
+        south_west, north_east = bounds["_southWest"], bounds["_northEast"]
+        return (
+            round(math.floor(south_west["lng"] / VIEW_GRID) * VIEW_GRID, 6),
+            round(math.floor(south_west["lat"] / VIEW_GRID) * VIEW_GRID, 6),
+            round(math.ceil(north_east["lng"] / VIEW_GRID) * VIEW_GRID, 6),
+            round(math.ceil(north_east["lat"] / VIEW_GRID) * VIEW_GRID, 6),
+        )
+    except (KeyError, TypeError):
+        return None
+
+def view_within(view, outer):
+    """True if the view lies inside outer, whose points are already drawn."""
+    return outer is not None and (
+        view[0] >= outer[0] and view[1] >= outer[1] and view[2] <= outer[2] and view[3] <= outer[3]
+    )
+
+def fetch_view_points(versions, bbox, barrio_ids, show_metro_stations, regimen_codes, show_zonas_infantiles):
+    """
+    Returns the points drawn on the map: those of the selected barrios that fall
+    in the view (bbox None means the whole city), each layer read with the paged
+    spatial query. Layers that are not shown are empty. None on error.
+
+    Returns:
+        tuple: (metro stops, schools, playgrounds)
+    """
+    try:
+        catalog = load_layer_catalog(
+            MAP_POINT_TABLES, tuple(versions.get(table_name, 0) for table_name in MAP_POINT_TABLES)
+        )
+        shown = {
+            'paradas_metro': show_metro_stations,
+            'centros_educativos': regimen_codes is not None,
+            'zonas_infantiles': show_zonas_infantiles,
+        }
+        points = {}
+        for table_name in MAP_POINT_TABLES:
+            columns, geo_col = catalog[table_name]
+            if shown[table_name]:
+                points[table_name] = fetch_features(
+                    table_name, bbox=bbox, barrio_ids=barrio_ids, layer=catalog[table_name]
+                )
+            else:
+                points[table_name] = features_page([], [c for c in columns if c != geo_col] + ['geometry'])
     except Exception as e:
-        st.error(f"Error al guardar los datos en la tabla 'demanda': {e}")
+        st.error(f"Error fetching map points: {e}")
+        return None
+    centros = points['centros_educativos']
+    if regimen_codes is not None:
+        centros = centros[centros['regimen_code'].isin(regimen_codes)]
+    return points['paradas_metro'], centros, points['zonas_infantiles']
+
+def estimate_map_size(barrios_data, shape_column, *point_layers):
+    """
+    Approximate rendered size of a map without rendering it: the GeoJSON of its
+    barrios, already serialized by PostGIS, plus MAP_POINT_SIZE per point.
+    """
+    shapes = barrios_data.get(shape_column, pd.Series(dtype=object)).dropna()
+    return int(shapes.str.len().sum()) + MAP_POINT_SIZE * sum(len(points) for points in point_layers)
+
+class MapCache:
+    """
+    LRU of built maps shared by all sessions, each weighed by its estimated
+    rendered size; the least recently used maps are evicted while the total
+    exceeds max_size. The cached maps are never rendered: st_folium rewrites the
+    ids of the map it renders, so each run renders its own copy (copy_map). The
+    copy is not kept in the session, which only holds ids.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.maps = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.maps:
+                return None
+            self.maps.move_to_end(key)
+            return self.maps[key][0]
+
+    def put(self, key, m, size):
+        with self.lock:
+            if key in self.maps:
+                self.size -= self.maps.pop(key)[1]
+            self.maps[key] = (m, size)
+            self.size += size
+            while self.size > self.max_size and len(self.maps) > 1:
+                _, (_, evicted_size) = self.maps.popitem(last=False)
+                self.size -= evicted_size
+
+def copy_map(m):
+    """
+    Deep copy of a cached map for one run to render. The Jinja templates of its
+    elements are shared with the original: rendering does not modify them, and
+    copying them would copy their whole environment.
+    """
+    memo = {}
+    def share_templates(element):
+        template = getattr(element, '_template', None)
+        if template is not None:
+            memo[id(template)] = template
+        for child in element._children.values():
+            share_templates(child)
+    share_templates(m.get_root())
+    return copy.deepcopy(m, memo)
+
+@st.cache_resource
+def get_map_cache():
+    return MapCache(MAP_CACHE_MAX_SIZE)
+
+def filter_signature(min_security, price_category, require_metro, school_types):
+    """
+    Canonical form of the applied filters: equivalent selections (school types in
+    another order) give the same tuple. School types become their regimen codes,
+    or None when schools are not filtered.
+    """
+    if school_types is not None:
+        school_types = school_codes(school_types)
+    return (
+        int(min_security),
+        int(price_category),
+        bool(require_metro),
+        school_types,
+    )
+
+def resolve_filter_results(barrio_ids, regimen_codes, show_zonas_infantiles, barrio_features, metro_data, centros_data, zonas_data):
+    """
+    Resolves a filter result, kept in the session as barrio ids only, against the
+    shared layers: the points are those of the selected barrios (and, for schools,
+    of the applied regimens). The frames are selected per rerun with integer masks
+    and never stored in the session.
+
+    Returns:
+        tuple: (barrios, metro stops, schools, playgrounds)
+    """
+    filtered_barrios_data = barrio_features[barrio_features['barrio_id'].isin(barrio_ids)]
+    metro_data_filtered = filter_metro_within_barrios(metro_data, filtered_barrios_data)
+
+    if regimen_codes is not None:
+        centros_data_filtered = filter_centers_within_barrios(centros_data, filtered_barrios_data)
+        centros_data_filtered = centros_data_filtered[centros_data_filtered['regimen_code'].isin(regimen_codes)]
+    else:
+        centros_data_filtered = centros_data.iloc[0:0]
+
+    if show_zonas_infantiles:
+        zonas_infantiles_filtered = filter_zonas_infantiles_within_barrios(zonas_data, filtered_barrios_data)
+    else:
+        zonas_infantiles_filtered = zonas_data.iloc[0:0]
+
+    return filtered_barrios_data, metro_data_filtered, centros_data_filtered, zonas_infantiles_filtered
+
+# Demand events are written in batches of up to DEMAND_BATCH_SIZE rows, at least
+# every DEMAND_FLUSH_SECONDS, retrying a failed batch DEMAND_MAX_RETRIES times
+DEMAND_BATCH_SIZE = 500
+DEMAND_FLUSH_SECONDS = 2.0
+DEMAND_MAX_RETRIES = 5
+
+DEMAND_COLUMNS = ('barrio_id', 'barrio', 'email', 'nombre', 'apellidos', 'tipo_transaccion', 'timestamp')
+DEMAND_TYPES = ('integer', 'varchar', 'varchar', 'varchar', 'varchar', 'varchar', 'timestamp')
+
+# One statement per batch: each column travels as an array and unnest() rebuilds the rows
+DEMAND_INSERT = text(f"""
+    INSERT INTO demanda ({', '.join(DEMAND_COLUMNS)})
+    SELECT * FROM unnest({', '.join(f'CAST(:{c} AS {t}[])' for c, t in zip(DEMAND_COLUMNS, DEMAND_TYPES))});
+""")
+
+class DemandWriter:
+    """
+    Write-behind log of demand events shared by all sessions. add() only queues
+    the rows; a background thread writes them to 'demanda' in batches, when a
+    batch is full or DEMAND_FLUSH_SECONDS after its first row, retries failed
+    batches with backoff and drains the queue when the process exits.
+    The engine is taken when the writer is created, in a script run: the thread
+    has no script run context to call the cached get_database_engine from.
+    """
+    _STOP = object()
+
+    def __init__(self):
+        self.engine = get_database_engine()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="demand-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def add(self, rows):
+        for row in rows:
+            self.queue.put(row)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            row = self.queue.get()
+            deadline = monotonic() + DEMAND_FLUSH_SECONDS
+            while True:
+                if row is self._STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+                if len(batch) >= DEMAND_BATCH_SIZE:
+                    break
+                try:
+                    row = self.queue.get(timeout=max(deadline - monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+
+    def write(self, batch):
+        params = {column: list(values) for column, values in zip(DEMAND_COLUMNS, zip(*batch))}
+        for attempt in range(DEMAND_MAX_RETRIES):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(DEMAND_INSERT, params)
+                return
+            except Exception as e:
+                print(f"Error al guardar {len(batch)} filas en la tabla 'demanda' (intento {attempt + 1}): {e}")
+                if attempt + 1 < DEMAND_MAX_RETRIES:
+                    sleep(0.5 * 2 ** attempt)
+        print(f"Se descartan {len(batch)} filas de la tabla 'demanda' tras {DEMAND_MAX_RETRIES} intentos.")
+
+    def close(self):
+        self.queue.put(self._STOP)
+        self.thread.join(timeout=DEMAND_FLUSH_SECONDS + 60)
+
+@st.cache_resource
+def get_demand_writer():
+    return DemandWriter()
+
+def save_demanda(barrios, email, nombre, apellidos, transaction_type):
+    """
+    Guarda los datos de la demanda en la tabla 'demanda' en la base de datos.
+    barrios is a list of (barrio_id, nombre) pairs from barrio_dim. The rows are
+    queued for the shared DemandWriter, so the user does not wait for the insert;
+    the timestamp is that of the request, not of the write.
+    """
+    timestamp = datetime.now()
+    get_demand_writer().add(
+        (barrio_id, barrio, email, nombre, apellidos, transaction_type, timestamp)
+        for barrio_id, barrio in barrios
+    )
 
 def reset_session():
     for key in st.session_state.keys():
@@ -352,13 +877,15 @@ def main():
         st.header(f"Hola {st.session_state.nombre}, personaliza tu mapa:")
 
         with st.spinner('Cargando datos geográficos...'):
-            metro_data = fetch_data("paradas_metro")
-            barrios_data = fetch_data("barrios_valencia")
-            centros_data = fetch_data("centros_educativos")
-            precios_data = fetch_data("precios_barrios")
-            zonas_infantiles_data = fetch_data("zonas_infantiles")  
-
-        if metro_data is None or barrios_data is None or centros_data is None or precios_data is None:
+            versions = fetch_data_versions()
+            layers = fetch_layers(LAYER_TABLES, versions)
+            metro_data = layers["paradas_metro"]
+            centros_data = layers["centros_educativos"]
+            precios_data = layers["precios_barrios"]
+            zonas_infantiles_data = layers["zonas_infantiles"]
+            barrio_features = fetch_barrio_features(versions)
+
+        if metro_data is None or centros_data is None or precios_data is None or barrio_features is None:
             st.error("No se pudieron obtener los datos geográficos. Verifica la conexión con la base de datos.")
         else:
             st.sidebar.subheader("Filtros de Barrios:")
@@ -419,106 +946,159 @@ def main():
                 st.session_state.show_results = False
 
             if st.button("Aplicar filtros"):
-                filtered_barrios_data = barrios_data[barrios_data['criminalidad'] >= security_value]
-
-                if price_category != "Todos":
-                    price_map = price_options
-                    selected_price_category = price_map[price_category]
-                    
-                    price_merged = filtered_barrios_data.merge(
-                        precios_data, 
-                        left_on='nombre',
-                        right_on='barrio',
-                        how='inner'
-                    )
-                    
-                    filtered_barrios_data = price_merged[
-                        price_merged['categoria_precio'] == selected_price_category
-                    ]
-
-                metro_data_filtered = filter_metro_within_barrios(metro_data, filtered_barrios_data)
-                if filter_metro_stations_only and show_metro_stations:
-                    filtered_barrios_data = filtered_barrios_data[
-                        filtered_barrios_data.geometry.intersects(metro_data_filtered.geometry.unary_union)
-                    ]
-
-                if need_educational_centers == "Sí":
-                    centros_data_filtered = filter_centers_within_barrios(
-                        centros_data, filtered_barrios_data, metro_data, filter_metro_stations_only
+                barrio_ids = fetch_filtered_barrio_ids(
+                    security_value,
+                    price_options[price_category],
+                    filter_metro_stations_only,
+                    selected_school_types if need_educational_centers == "Sí" else None
+                )
+                # A failed query (None, already reported) leaves the previous results as they were
+                if barrio_ids is not None:
+                    # Only the ids and the applied filters are kept in the session
+                    st.session_state.filtered_barrio_ids = np.array(barrio_ids, dtype=np.int32)
+                    st.session_state.applied_filters = filter_signature(
+                        security_value,
+                        price_options[price_category],
+                        filter_metro_stations_only,
+                        selected_school_types if need_educational_centers == "Sí" else None
                     )
-                    centros_data_filtered = centros_data_filtered[
-                        centros_data_filtered['regimen_normalized'].isin([normalize_text(t) for t in selected_school_types])
-                    ]
-
-                    if len(centros_data_filtered) > 0:
-                        filtered_barrios_data = filtered_barrios_data[
-                            filtered_barrios_data.geometry.intersects(centros_data_filtered.unary_union)
+                    st.session_state.filter_versions = tuple(versions.get(table, 0) for table in FILTER_TABLES)
+                    st.session_state.show_results = True
+
+                    # Guardar en la tabla 'demanda'
+                    filtered_barrios_data = barrio_features[barrio_features['barrio_id'].isin(st.session_state.filtered_barrio_ids)]
+                    if 'nombre' in filtered_barrios_data.columns:
+                        barrios_optimos = [
+                            (int(barrio_id), barrio)
+                            for barrio_id, barrio in filtered_barrios_data[['barrio_id', 'nombre']]
+                            .drop_duplicates().itertuples(index=False, name=None)
                         ]
-                    else:
-                        filtered_barrios_data = gpd.GeoDataFrame(columns=filtered_barrios_data.columns)
-                else:
-                    centros_data_filtered = pd.DataFrame(columns=centros_data.columns)
-
-                if show_zonas_infantiles:
-                    zonas_infantiles_filtered = filter_zonas_infantiles_within_barrios(
-                        zonas_infantiles_data, filtered_barrios_data
-                    )
-                else:
-                    zonas_infantiles_filtered = gpd.GeoDataFrame(columns=zonas_infantiles_data.columns)
-
-                st.session_state.filtered_barrios_data = filtered_barrios_data
-                st.session_state.metro_data_filtered = metro_data_filtered
-                st.session_state.centros_data_filtered = centros_data_filtered
-                st.session_state.zonas_infantiles_filtered = zonas_infantiles_filtered
-                st.session_state.show_results = True
-
-                # Guardar en la tabla 'demanda'
-                if 'nombre' in filtered_barrios_data.columns:
-                    barrios_optimos = filtered_barrios_data['nombre'].unique().tolist()
-                    save_demanda(
-                        barrios_optimos,
-                        st.session_state.email,
-                        st.session_state.nombre,
-                        st.session_state.apellidos,
-                        transaction_type
-                    )
-                    st.success("Los datos se han guardado en la tabla 'demanda'.")
+                        save_demanda(
+                            barrios_optimos,
+                            st.session_state.email,
+                            st.session_state.nombre,
+                            st.session_state.apellidos,
+                            transaction_type
+                        )
+                        st.success("Tu búsqueda ha quedado registrada.")
+
+            if "map_zoom" not in st.session_state:
+                st.session_state.map_zoom = 12
+                st.session_state.map_center = None
+                st.session_state.map_view = None
+
+            # Ids from an older data generation are recomputed with the applied filters,
+            # so the results and the map key always belong to the current data
+            filter_versions = tuple(versions.get(table, 0) for table in FILTER_TABLES)
+            if st.session_state.show_results and st.session_state.filter_versions != filter_versions:
+                min_security, price_value, require_metro, regimen_codes = st.session_state.applied_filters
+                barrio_ids = fetch_filtered_barrio_ids(
+                    min_security, price_value, require_metro, school_types_of(regimen_codes)
+                )
+                if barrio_ids is not None:
+                    st.session_state.filtered_barrio_ids = np.array(barrio_ids, dtype=np.int32)
+                    st.session_state.filter_versions = filter_versions
 
             if st.session_state.show_results:
+                filtered_barrios_data, metro_data_filtered, centros_data_filtered, zonas_infantiles_filtered = resolve_filter_results(
+                    st.session_state.filtered_barrio_ids,
+                    st.session_state.applied_filters[3],
+                    show_zonas_infantiles,
+                    barrio_features,
+                    metro_data,
+                    centros_data,
+                    zonas_infantiles_data
+                )
+
                 st.subheader("Mapa Interactivo")
-                m = create_map(
-                    st.session_state.metro_data_filtered, 
-                    barrios_data, 
-                    st.session_state.centros_data_filtered,
-                    st.session_state.zonas_infantiles_filtered, 
-                    filter_metro_stations_only, 
-                    st.session_state.filtered_barrios_data, 
-                    show_metro_stations, 
-                    selected_school_types,
-                    show_zonas_infantiles
+                # Maps are shared by every session that applied the same filters and
+                # shows the same layers at the same level of detail over the same data
+                map_key = (
+                    st.session_state.applied_filters,
+                    st.session_state.filter_versions,
+                    tuple(versions.get(table, 0) for table in MAP_TABLES),
+                    show_metro_stations,
+                    school_codes(selected_school_types),
+                    show_zonas_infantiles,
+                    barrio_shape_column(st.session_state.map_zoom),
+                    st.session_state.map_view,
                 )
-                st_folium(m, width=900, height=600)
+                map_cache = get_map_cache()
+                cached_map = map_cache.get(map_key)
+                if cached_map is None:
+                    # Only the points of the selected barrios in the current view are read
+                    view_points = fetch_view_points(
+                        versions,
+                        st.session_state.map_view,
+                        st.session_state.filtered_barrio_ids,
+                        show_metro_stations,
+                        st.session_state.applied_filters[3],
+                        show_zonas_infantiles
+                    )
+                    if view_points is not None:
+                        view_metro, view_centros, view_zonas = view_points
+                        m = create_map(
+                            view_metro, 
+                            barrio_features, 
+                            view_centros,
+                            view_zonas, 
+                            filter_metro_stations_only, 
+                            filtered_barrios_data, 
+                            show_metro_stations, 
+                            selected_school_types,
+                            show_zonas_infantiles,
+                            zoom=st.session_state.map_zoom
+                        )
+                        map_cache.put(map_key, m, estimate_map_size(
+                            filtered_barrios_data,
+                            barrio_shape_column(st.session_state.map_zoom),
+                            view_metro,
+                            view_centros,
+                            view_zonas
+                        ))
+                        cached_map = m
+                map_state = None
+                if cached_map is not None:
+                    # The view is not part of the cached map: st_folium moves it
+                    map_state = st_folium(
+                        copy_map(cached_map), width=900, height=600,
+                        returned_objects=["zoom", "center", "bounds"],
+                        zoom=st.session_state.map_zoom, center=st.session_state.map_center
+                    )
+
+                # Redraw when the zoom crosses a level of detail or the view leaves the
+                # area whose points are drawn (the first map, before the view is known,
+                # draws the whole city)
+                if map_state and map_state.get("zoom") and map_state.get("center"):
+                    zoom = map_state["zoom"]
+                    view = snap_view(map_state.get("bounds"))
+                    if (barrio_shape_column(zoom) != barrio_shape_column(st.session_state.map_zoom)
+                            or (view is not None and not view_within(view, st.session_state.map_view))):
+                        st.session_state.map_zoom = zoom
+                        st.session_state.map_center = [map_state["center"]["lat"], map_state["center"]["lng"]]
+                        st.session_state.map_view = view
+                        st.rerun()
 
                 st.subheader("Detalles de los Barrios")
-                filtered_display = st.session_state.filtered_barrios_data.drop(columns=['geometry', 'geo_shape'], errors='ignore')
+                filtered_display = filtered_barrios_data.drop(columns=['geometry', 'geo_shape', *BARRIO_SHAPE_COLUMNS], errors='ignore')
                 st.dataframe(filtered_display)
 
                 st.subheader("Paradas de Metro Filtradas")
-                metro_display = st.session_state.metro_data_filtered.drop(columns=['geometry', 'geo_point_2d'], errors='ignore')
+                metro_display = metro_data_filtered.drop(columns=['geometry', 'geo_point_2d'], errors='ignore')
                 st.dataframe(metro_display)
 
                 if need_educational_centers == "Sí":
                     st.subheader("Centros Educativos Filtrados")
-                    if not st.session_state.centros_data_filtered.empty:
+                    if not centros_data_filtered.empty:
                         columnas_a_mostrar = ['nombre', 'regimen', 'direccion', 'mail', 'telef', 'dgenerica_', 'despecific']
-                        columnas_presentes = [col for col in columnas_a_mostrar if col in st.session_state.centros_data_filtered.columns]
-                        st.dataframe(st.session_state.centros_data_filtered[columnas_presentes])
+                        columnas_presentes = [col for col in columnas_a_mostrar if col in centros_data_filtered.columns]
+                        st.dataframe(centros_data_filtered[columnas_presentes])
                     else:
                         st.info("No hay centros educativos disponibles para mostrar.")
 
                 if show_zonas_infantiles:
                     st.subheader("Zonas Infantiles Filtradas")
-                    zonas_display = st.session_state.zonas_infantiles_filtered.drop(columns=['geometry', 'geo_shape', 'geo_point_2d'], errors='ignore')
+                    zonas_display = zonas_infantiles_filtered.drop(columns=['geometry', 'geo_shape', 'geo_point_2d'], errors='ignore')
                     st.dataframe(zonas_display)
 
 if __name__ == "__main__":
@@ -11,23 +11,6 @@ DB_CONFIG = {
     "password": "postgres",
 }
 
-# Lista de barrios predefinidos
-BARRIOS = [
-    "L'AMISTAT", "EL GRAU", "RAFALELL-VISTABELLA", "LA CARRASCA", "BENIFERRI", "EL SALER", "CARPESA", "SANT ANTONI",
-    "MARXALENES", "EL CALVARI", "LES TENDETES", "EXPOSICIO", "LA VEGA BAIXA", "L'HORT DE SENABRE", "EL PILAR", 
-    "CAMI FONDO", "RUSSAFA", "SAFRANAR", "EN CORTS", "LES CASES DE BARCENA", "CIUTAT FALLERA", "NOU MOLES", 
-    "MESTALLA", "MAHUELLA-TAULADELLA", "MASSARROJOS", "LA LLUM", "LA MALVA-ROSA", "MORVEDRE", "SANT PAU", 
-    "JAUME ROIG", "SANT MARCEL.LI", "LA CREU COBERTA", "CAMI REAL", "LA PUNTA", "CAMPANAR", "EL CARME", 
-    "BENIMAMET", "SANT LLORENS", "CIUTAT UNIVERSITARIA", "BETERO", "EL PLA DEL REMEI", "LA XEREA", "ALBORS", 
-    "ARRANCAPINS", "LA ROQUETA", "LA GRAN VIA", "LA CREU DEL GRAU", "SANT ISIDRE", "MALILLA", "BENICALAP", 
-    "LA PETXINA", "PENYA-ROJA", "FAITANAR", "EL FORN D'ALCEDO", "PINEDO", "CASTELLAR-L'OLIVERAL", "AIORA", 
-    "NA ROVELLA", "FAVARA", "NATZARET", "LA FONTETA S.LLUIS", "CIUTAT JARDI", "CAMI DE VERA", "EL PALMAR", 
-    "EL PERELLONET", "VARA DE QUART", "SOTERNES", "LA FONTSANTA", "EL BOTANIC", "BORBOTO", "L'ILLA PERDUDA", 
-    "TRES FORQUES", "PATRAIX", "LA RAIOSA", "BENIFARAIG", "TORREFIEL", "TORMOS", "BENIMACLET", "TRINITAT", 
-    "CABANYAL-CANYAMELAR", "EL MERCAT", "POBLE NOU", "CIUTAT DE LES ARTS I DE LES CIENCIES", "LA TORRE", 
-    "SANT FRANCESC", "ELS ORRIOLS", "LA SEU", "MONTOLIVET"
-]
-
 def create_sqlalchemy_engine():
     """
     Crea un motor SQLAlchemy para conectarse a PostgreSQL.
@@ -35,6 +18,19 @@ def create_sqlalchemy_engine():
     connection_string = f"postgresql+pg8000://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
     return create_engine(connection_string)
 
+def load_barrios():
+    """
+    Carga los barrios de la dimensión canónica 'barrio_dim' como un diccionario nombre -> barrio_id.
+    """
+    try:
+        engine = create_sqlalchemy_engine()
+        with engine.connect() as conn:
+            result = conn.execute(text("SELECT nombre, barrio_id FROM barrio_dim ORDER BY nombre;"))
+            return dict(result.fetchall())
+    except Exception as e:
+        st.error(f"Error al cargar la lista de barrios: {e}")
+        return {}
+
 def check_table_exists(conn, table_name):
     """
     Verifica si la tabla existe en la base de datos.
@@ -79,6 +75,7 @@ def save_property_to_db(property_data, table_name):
             conn.execute(text(f"""
                 CREATE TABLE IF NOT EXISTS {table_name} (
                     id SERIAL PRIMARY KEY,
+                    barrio_id INTEGER REFERENCES barrio_dim (barrio_id),
                     barrio TEXT,
                     direccion TEXT,
                     numero_calle TEXT,
@@ -92,14 +89,19 @@ def save_property_to_db(property_data, table_name):
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
             """))
+            # Las tablas creadas antes de existir barrio_dim no tienen la columna
+            conn.execute(text(f"""
+                ALTER TABLE {table_name}
+                ADD COLUMN IF NOT EXISTS barrio_id INTEGER REFERENCES barrio_dim (barrio_id);
+            """))
 
             # Insertar los datos de la propiedad
             insert_query = text(f"""
                 INSERT INTO {table_name} (
-                    barrio, direccion, numero_calle, metros_cuadrados, habitaciones,
+                    barrio_id, barrio, direccion, numero_calle, metros_cuadrados, habitaciones,
                     banos, dependencias, ascensor, parking, precio
                 ) VALUES (
-                    :barrio, :direccion, :numero_calle, :metros_cuadrados, :habitaciones,
+                    :barrio_id, :barrio, :direccion, :numero_calle, :metros_cuadrados, :habitaciones,
                     :banos, :dependencias, :ascensor, :parking, :precio
                 )
             """)
@@ -123,11 +125,13 @@ def main():
     st.title("Subida de Propiedades - Venta o Alquiler")
     st.write("Por favor, complete los datos del formulario para registrar una nueva propiedad.")
 
+    barrios = load_barrios()
+
     with st.form(key="property_form"):
         st.subheader("Detalles de la Propiedad")
 
         tipo_operacion = st.radio("¿Es una propiedad para venta o alquiler?", ["Venta", "Alquiler"])
-        barrio = st.selectbox("Barrio:", options=BARRIOS)
+        barrio = st.selectbox("Barrio:", options=list(barrios))
         direccion = st.text_input("Dirección:")
         numero_calle = st.text_input("Número de la Calle:")
         metros_cuadrados = st.number_input("Metros Cuadrados:", min_value=0.0, format="%.2f")
@@ -142,6 +146,7 @@ def main():
 
         if submit_button:
             property_data = {
+                "barrio_id": barrios.get(barrio),
                 "barrio": barrio,
                 "direccion": direccion,
                 "numero_calle": numero_calle,
@@ -35,18 +35,21 @@ def fetch_filtered_rental_data(habitaciones, banos, ascensor, parking):
         parking_boolean = True if parking == "Sí" else False
 
         # Query to compute average monthly rent
+        # Grouped by the canonical barrio (barrio_dim) so both tables use the same keys;
+        # listings whose barrio has no match yet keep their own name
         query = """
-            SELECT barrio, AVG(precio) AS alquiler_mensual
-            FROM alquileres
-            WHERE habitaciones = %s
-            AND banos = %s
-            AND ascensor = %s
-            AND parking = %s
-            GROUP BY barrio
+            SELECT a.barrio_id, COALESCE(d.nombre, a.barrio) AS barrio, AVG(a.precio) AS alquiler_mensual
+            FROM alquileres a
+            LEFT JOIN barrio_dim d ON d.barrio_id = a.barrio_id
+            WHERE a.habitaciones = %s
+            AND a.banos = %s
+            AND a.ascensor = %s
+            AND a.parking = %s
+            GROUP BY a.barrio_id, COALESCE(d.nombre, a.barrio)
         """
 
         cursor.execute(query, (habitaciones, banos, ascensor_boolean, parking_boolean))
-        data = pd.DataFrame(cursor.fetchall(), columns=["barrio", "alquiler_mensual"])
+        data = pd.DataFrame(cursor.fetchall(), columns=["barrio_id", "barrio", "alquiler_mensual"])
 
     except Exception as e:
         st.error(f"Database query error in rental data fetch: {e}")
@@ -67,18 +70,21 @@ def fetch_filtered_purchase_data(habitaciones, banos, ascensor, parking):
         parking_boolean = True if parking == "Sí" else False
 
         # Query to compute average purchase cost
+        # Grouped by the canonical barrio (barrio_dim) so both tables use the same keys;
+        # listings whose barrio has no match yet keep their own name
         query = """
-            SELECT barrio, AVG(precio) AS precio_venta
-            FROM compras
-            WHERE habitaciones = %s
-            AND banos = %s
-            AND ascensor = %s
-            AND parking = %s
-            GROUP BY barrio
+            SELECT a.barrio_id, COALESCE(d.nombre, a.barrio) AS barrio, AVG(a.precio) AS precio_venta
+            FROM compras a
+            LEFT JOIN barrio_dim d ON d.barrio_id = a.barrio_id
+            WHERE a.habitaciones = %s
+            AND a.banos = %s
+            AND a.ascensor = %s
+            AND a.parking = %s
+            GROUP BY a.barrio_id, COALESCE(d.nombre, a.barrio)
         """
 
         cursor.execute(query, (habitaciones, banos, ascensor_boolean, parking_boolean))
-        data = pd.DataFrame(cursor.fetchall(), columns=["barrio", "precio_venta"])
+        data = pd.DataFrame(cursor.fetchall(), columns=["barrio_id", "barrio", "precio_venta"])
 
     except Exception as e:
         st.error(f"Database query error in purchase data fetch: {e}")
@@ -125,12 +131,13 @@ purchase_data = fetch_filtered_purchase_data(num_habitaciones, num_banos, ascens
 if rental_data.empty or purchase_data.empty:
     st.warning("No data found for these filters. Try modifying the selection criteria.")
 else:
-    # Merge the rental and purchase data on 'barrio' for analysis
+    # Merge the rental and purchase data on the barrio for analysis
+    # (unmatched listings have no barrio_id and pair up by name)
     analysis_df = pd.merge(
         rental_data,
         purchase_data,
         how="inner",
-        on="barrio"
+        on=["barrio_id", "barrio"]
     )
 
     # Compute the annual income and rentability percentage dynamically
@@ -0,0 +1,114 @@
+import pandas as pd
+import pg8000
+import streamlit as st
+
+# Database Configuration
+CONFIG_DB = {
+    "host": "postgres",
+    "port": 5432,
+    "database": "postgres",
+    "user": "postgres",
+    "password": "postgres",
+}
+
+# Time windows of the page: label -> (rollup table, days). The hourly rollup is
+# only used for short windows; both are maintained by scriptdemanda.py.
+PERIODOS = {
+    "Últimas 48 horas": ("demanda_por_hora", 2),
+    "Últimos 7 días": ("demanda_por_dia", 7),
+    "Últimos 30 días": ("demanda_por_dia", 30),
+    "Últimos 90 días": ("demanda_por_dia", 90),
+    "Último año": ("demanda_por_dia", 365),
+}
+
+# Connect to PostgreSQL
+def connect_to_db():
+    conn = pg8000.connect(**CONFIG_DB)
+    cursor = conn.cursor()
+    return conn, cursor
+
+# Rollups are read at most once a minute per filter combination
+@st.cache_data(ttl=60)
+def fetch_top_barrios(tabla, dias, tipo_transaccion, limite):
+    conn, cursor = connect_to_db()
+
+    try:
+        # Only the rollup table is read, never the raw demanda events
+        query = f"""
+            SELECT d.nombre AS barrio, SUM(r.eventos) AS busquedas
+            FROM {tabla} r
+            JOIN barrio_dim d ON d.barrio_id = r.barrio_id
+            WHERE r.periodo >= CURRENT_TIMESTAMP - make_interval(days => %s)
+            AND (CAST(%s AS TEXT) IS NULL OR r.tipo_transaccion = %s)
+            GROUP BY d.barrio_id, d.nombre
+            ORDER BY busquedas DESC
+            LIMIT %s
+        """
+
+        cursor.execute(query, (dias, tipo_transaccion, tipo_transaccion, limite))
+        data = pd.DataFrame(cursor.fetchall(), columns=["barrio", "busquedas"])
+
+    except Exception as e:
+        st.error(f"Database query error in top barrios fetch: {e}")
+        data = pd.DataFrame(columns=["barrio", "busquedas"])
+    finally:
+        cursor.close()
+        conn.close()
+
+    return data
+
+@st.cache_data(ttl=60)
+def fetch_demand_trend(tabla, dias, tipo_transaccion):
+    conn, cursor = connect_to_db()
+
+    try:
+        query = f"""
+            SELECT r.periodo, r.tipo_transaccion, SUM(r.eventos) AS busquedas
+            FROM {tabla} r
+            WHERE r.periodo >= CURRENT_TIMESTAMP - make_interval(days => %s)
+            AND (CAST(%s AS TEXT) IS NULL OR r.tipo_transaccion = %s)
+            GROUP BY r.periodo, r.tipo_transaccion
+            ORDER BY r.periodo
+        """
+
+        cursor.execute(query, (dias, tipo_transaccion, tipo_transaccion))
+        data = pd.DataFrame(cursor.fetchall(), columns=["periodo", "tipo_transaccion", "busquedas"])
+
+    except Exception as e:
+        st.error(f"Database query error in demand trend fetch: {e}")
+        data = pd.DataFrame(columns=["periodo", "tipo_transaccion", "busquedas"])
+    finally:
+        cursor.close()
+        conn.close()
+
+    return data
+
+# Streamlit App - Demand analytics
+st.title("Demanda por Barrio")
+
+st.sidebar.header("Filtros")
+
+periodo = st.sidebar.selectbox("Periodo:", options=list(PERIODOS), index=2)
+
+tipo = st.sidebar.radio("Tipo de transacción:", ("Todas", "Alquilar", "Comprar"))
+tipo_transaccion = None if tipo == "Todas" else tipo
+
+num_barrios = st.sidebar.slider("Número de barrios:", min_value=5, max_value=30, value=10)
+
+tabla, dias = PERIODOS[periodo]
+top_barrios = fetch_top_barrios(tabla, dias, tipo_transaccion, num_barrios)
+trend = fetch_demand_trend(tabla, dias, tipo_transaccion)
+
+if top_barrios.empty:
+    st.warning("No hay búsquedas registradas en este periodo.")
+else:
+    st.subheader(f"Barrios más buscados ({periodo.lower()})")
+    top_barrios["busquedas"] = top_barrios["busquedas"].astype(int)
+    st.bar_chart(top_barrios.set_index("barrio")["busquedas"])
+    st.table(top_barrios.rename(columns={"barrio": "Barrio", "busquedas": "Búsquedas"}))
+
+    st.subheader("Evolución de la demanda")
+    trend_chart = trend.pivot_table(
+        index="periodo", columns="tipo_transaccion", values="busquedas", aggfunc="sum", fill_value=0
+    )
+    st.line_chart(trend_chart)
@@ -1,3 +1,8 @@
+import re
+import sys
+from datetime import date
+from time import sleep
+
 import pandas as pd
 import pg8000
 import streamlit as st
@@ -17,47 +22,263 @@ def connect_to_db():
     cursor = conn.cursor()
     return conn, cursor
 
+COLUMNAS_DEMANDA = ('id', 'barrio_id', 'barrio', 'email', 'nombre', 'apellidos', 'tipo_transaccion', 'timestamp')
+
+# Monthly partitions created ahead of the current month on every maintenance run
+DEMANDA_MESES_FUTUROS = 3
+
+# Seconds between maintenance runs (partitions and retention) with --mantener
+DEMANDA_MANTENIMIENTO_SEGUNDOS = 6 * 3600
+
+# Partitions older than this many months are detached from demanda and, if
+# DEMANDA_ARCHIVAR, kept as demanda_archivo_YYYY_MM tables; otherwise dropped.
+# The rollups keep their counts.
+DEMANDA_RETENCION_MESES = 24
+DEMANDA_ARCHIVAR = True
+
+def add_months(mes, meses):
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+def create_demanda_partition(cursor, mes):
+    """
+    Creates the partition of demanda for the month starting at mes, moving into
+    it the rows of that month that were stored in the default partition.
+    """
+    particion = f"demanda_{mes:%Y_%m}"
+    cursor.execute("SELECT to_regclass(%s);", (particion,))
+    if cursor.fetchone()[0] is not None:
+        return
+
+    desde, hasta = mes, add_months(mes, 1)
+    cursor.execute("CREATE TEMP TABLE demanda_movidas (LIKE demanda) ON COMMIT DROP;")
+    cursor.execute("""
+        WITH movidas AS (
+            DELETE FROM demanda_default
+            WHERE timestamp >= %s AND timestamp < %s
+            RETURNING *
+        )
+        INSERT INTO demanda_movidas SELECT * FROM movidas;
+    """, (desde, hasta))
+    cursor.execute(f"""
+        CREATE TABLE {particion} PARTITION OF demanda
+        FOR VALUES FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}');
+    """)
+    # Straight into the partition: the rows are already counted in the rollups
+    cursor.execute(f"INSERT INTO {particion} SELECT * FROM demanda_movidas;")
+    cursor.execute("DROP TABLE demanda_movidas;")
+
+def create_demanda_partitions(cursor):
+    """
+    Creates the partitions of the current and coming months, and of every month
+    with rows in the default partition, which are moved into them.
+    """
+    mes_actual = date.today().replace(day=1)
+    meses = {add_months(mes_actual, meses) for meses in range(DEMANDA_MESES_FUTUROS + 1)}
+    cursor.execute("""
+        SELECT DISTINCT date_trunc('month', timestamp)::date
+        FROM demanda_default
+        WHERE timestamp IS NOT NULL;
+    """)
+    meses.update(mes for (mes,) in cursor.fetchall())
+    for mes in sorted(meses):
+        create_demanda_partition(cursor, mes)
+
+def apply_demanda_retention(cursor):
+    """
+    Detaches the monthly partitions older than DEMANDA_RETENCION_MESES, and
+    archives or drops them.
+    """
+    limite = add_months(date.today().replace(day=1), -DEMANDA_RETENCION_MESES)
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'demanda'::regclass;
+    """)
+    for (particion,) in cursor.fetchall():
+        fecha = re.fullmatch(r"demanda_(\d{4})_(\d{2})", particion)
+        if not fecha or date(int(fecha[1]), int(fecha[2]), 1) >= limite:
+            continue
+        cursor.execute(f"ALTER TABLE demanda DETACH PARTITION {particion};")
+        if DEMANDA_ARCHIVAR:
+            cursor.execute(f"ALTER TABLE {particion} RENAME TO demanda_archivo_{fecha[1]}_{fecha[2]};")
+        else:
+            cursor.execute(f"DROP TABLE {particion};")
+
+# Rollups of demanda per barrio, transaction type and time bucket: table -> date_trunc unit.
+# Rows without barrio_id (older than barrio_dim) are not counted.
+ROLLUPS_DEMANDA = {
+    "demanda_por_hora": "hour",
+    "demanda_por_dia": "day",
+}
+
+def create_demanda_rollups(cursor):
+    """
+    Creates the demand rollup tables and keeps them up to date with a statement
+    trigger on demanda: every INSERT adds its rows, already grouped, to the
+    rollups in the same transaction, so a batch of events is one upsert per
+    bucket. Rollups created now are filled with the rows already in demanda.
+    """
+    # No inserts between the backfill and the trigger: none would be counted
+    cursor.execute("LOCK TABLE demanda IN SHARE ROW EXCLUSIVE MODE;")
+
+    upserts = []
+    for table, unit in ROLLUPS_DEMANDA.items():
+        cursor.execute("SELECT to_regclass(%s);", (table,))
+        new_table = cursor.fetchone()[0] is None
+
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                barrio_id INTEGER NOT NULL REFERENCES barrio_dim (barrio_id),
+                tipo_transaccion VARCHAR(50) NOT NULL,
+                periodo TIMESTAMP NOT NULL,
+                eventos BIGINT NOT NULL,
+                PRIMARY KEY (barrio_id, tipo_transaccion, periodo)
+            );
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_periodo_idx ON {table} (periodo);")
+
+        upsert = f"""
+            INSERT INTO {table} (barrio_id, tipo_transaccion, periodo, eventos)
+            SELECT barrio_id, COALESCE(tipo_transaccion, ''), date_trunc('{unit}', timestamp), COUNT(*)
+            FROM {{origen}}
+            WHERE barrio_id IS NOT NULL
+            GROUP BY 1, 2, 3
+            ON CONFLICT (barrio_id, tipo_transaccion, periodo)
+            DO UPDATE SET eventos = {table}.eventos + EXCLUDED.eventos;
+        """
+        if new_table:
+            cursor.execute(upsert.format(origen="demanda"))
+        upserts.append(upsert.format(origen="nuevas"))
+
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION acumular_demanda() RETURNS trigger AS $$
+        BEGIN
+            {"".join(upserts)}
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS demanda_rollups ON demanda;")
+    cursor.execute("""
+        CREATE TRIGGER demanda_rollups
+        AFTER INSERT ON demanda
+        REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION acumular_demanda();
+    """)
+
 def create_demanda_table():
+    """
+    Creates (or converts) demanda as a table partitioned by month on timestamp,
+    with a BRIN index on timestamp, the partitions of the coming months, the
+    retention of old partitions and the demand rollups.
+    """
     conn, cursor = connect_to_db()
     try:
-        # First, check if the table exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS demanda (
-                id SERIAL PRIMARY KEY,
-                barrio VARCHAR(255),
-                email VARCHAR(255),
-                nombre VARCHAR(255),
-                apellidos VARCHAR(255),
-                tipo_transaccion VARCHAR(50),
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        
-        # Check if tipo_transaccion column exists
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM information_schema.columns 
-            WHERE table_name = 'demanda' 
-            AND column_name = 'tipo_transaccion';
-        """)
-        
-        column_exists = cursor.fetchone()[0]
-        
-        # Add the column if it doesn't exist
-        if column_exists == 0:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('demanda');")
+        fila = cursor.fetchone()
+        relkind = fila[0] if fila else None
+
+        # A demanda from before partitioning is renamed and copied into the new table
+        if relkind == 'r':
+            cursor.execute("""
+                ALTER TABLE demanda
+                ADD COLUMN IF NOT EXISTS tipo_transaccion VARCHAR(50),
+                ADD COLUMN IF NOT EXISTS barrio_id INTEGER REFERENCES barrio_dim (barrio_id);
+            """)
+            cursor.execute("ALTER TABLE demanda RENAME TO demanda_sin_particionar;")
+            cursor.execute("ALTER INDEX IF EXISTS demanda_pkey RENAME TO demanda_sin_particionar_pkey;")
+            cursor.execute("ALTER SEQUENCE IF EXISTS demanda_id_seq RENAME TO demanda_sin_particionar_id_seq;")
+
+        if relkind != 'p':
+            cursor.execute("""
+                CREATE TABLE demanda (
+                    id SERIAL,
+                    barrio_id INTEGER REFERENCES barrio_dim (barrio_id),
+                    barrio VARCHAR(255),
+                    email VARCHAR(255),
+                    nombre VARCHAR(255),
+                    apellidos VARCHAR(255),
+                    tipo_transaccion VARCHAR(50),
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, timestamp)
+                ) PARTITION BY RANGE (timestamp);
+            """)
+            # Rows outside every monthly partition; moved out when their month is created
+            cursor.execute("CREATE TABLE demanda_default PARTITION OF demanda DEFAULT;")
+
+        # Append-only and ordered by time: a BRIN index is tiny and prunes well
+        cursor.execute("CREATE INDEX IF NOT EXISTS demanda_timestamp_brin ON demanda USING brin (timestamp);")
+
+        if relkind == 'r':
+            cursor.execute("""
+                SELECT DISTINCT date_trunc('month', timestamp)::date
+                FROM demanda_sin_particionar
+                WHERE timestamp IS NOT NULL;
+            """)
+            for (mes,) in cursor.fetchall():
+                create_demanda_partition(cursor, mes)
+            # The rollup trigger is not on the new table yet, so the copy is not counted twice
+            cursor.execute(f"""
+                INSERT INTO demanda ({', '.join(COLUMNAS_DEMANDA)})
+                SELECT {', '.join(COLUMNAS_DEMANDA)} FROM demanda_sin_particionar;
+            """)
             cursor.execute("""
-                ALTER TABLE demanda 
-                ADD COLUMN tipo_transaccion VARCHAR(50);
+                SELECT setval(pg_get_serial_sequence('demanda', 'id'), COALESCE(MAX(id), 0) + 1, false)
+                FROM demanda;
             """)
-            
+            cursor.execute("DROP TABLE demanda_sin_particionar;")
+
+        create_demanda_partitions(cursor)
+        apply_demanda_retention(cursor)
+        create_demanda_rollups(cursor)
+
         conn.commit()
         st.success("Tabla 'demanda' creada o actualizada correctamente.")
+        return True
     except Exception as e:
         st.error(f"Error al crear/actualizar la tabla demanda: {e}")
+        return False
     finally:
         cursor.close()
         conn.close()
 
-# Ejecución
+def maintain_demanda():
+    """
+    Creates the monthly partitions that are missing and applies the retention,
+    in one transaction. Returns True if the maintenance succeeds.
+    """
+    conn, cursor = connect_to_db()
+    try:
+        create_demanda_partitions(cursor)
+        apply_demanda_retention(cursor)
+        conn.commit()
+        print("Mantenimiento de la tabla 'demanda' completado.")
+        return True
+    except Exception as e:
+        print(f"Error en el mantenimiento de la tabla demanda: {e}")
+        conn.rollback()
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+def run_demanda_maintenance():
+    """
+    Runs maintain_demanda every DEMANDA_MANTENIMIENTO_SEGUNDOS, so the partitions
+    of the coming months exist and the retention applies while the container runs.
+    """
+    while True:
+        sleep(DEMANDA_MANTENIMIENTO_SEGUNDOS)
+        try:
+            maintain_demanda()
+        except Exception as e:
+            print(f"Error al conectar para el mantenimiento de la tabla demanda: {e}")
+
+# Ejecución. Con --mantener solo repite el mantenimiento periódicamente
+# (la tabla ya la crea el orquestador)
 if __name__ == "__main__":
-    create_demanda_table()
\ No newline at end of file
+    if "--mantener" in sys.argv[1:]:
+        run_demanda_maintenance()
+    sys.exit(0 if create_demanda_table() else 1)
\ No newline at end of file
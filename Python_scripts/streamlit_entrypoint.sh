@@ -1,12 +1,11 @@
 #!/bin/sh
 set -e
 
-# Wait a bit to ensure previous scripts have completed
-
-echo "Waiting for database to be ready..."
-sleep 40
+# Wait until the ingestion run registered by orquestador.py has finished
+echo "Waiting for data ingestion to complete..."
+python orquestador.py --esperar || echo "Ingestion not finished, starting with the data available."
 
 
 # Run Streamlit
 echo "Starting Streamlit application..."
-streamlit run Bienvenido.py --server.port 8501 --server.address 0.0.0.0
\ No newline at end of file
+streamlit run Bienvenido.py --server.port 8501 --server.address 0.0.0.0